@@ -63,4 +63,16 @@ async def get_current_user(token):
     user = get_user(username)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
+
+
+# Dependency for HTTP endpoints that need a logged-in user (Authorization: Bearer <token>)
+async def require_user(token: str = Depends(oauth2_scheme)):
+    try:
+        return await get_current_user(token)
+    except WebSocketDisconnect:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
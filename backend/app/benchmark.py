@@ -0,0 +1,333 @@
+"""
+Offline ingest benchmark: drives synthetic telemetry through
+mqtt_interface.on_message -> IngestBridge -> process_data -> save_data,
+with no broker, and compares the results against a baseline file.
+
+Run from backend/app:
+
+    python benchmark.py                      # default scenario grid
+    python benchmark.py --hats 1 4 --channels 8 --degrees 1 3 --save off on
+    python benchmark.py --update-baseline    # record this machine's numbers
+
+Exits with status 1 if any scenario regressed beyond --tolerance.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import yaml
+
+import config_parser
+import data_interface
+import mqtt_interface
+from metrics import Histogram
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+MESSAGES = 5000  # messages timed per scenario
+WARMUP_MESSAGES = 200
+ALLOCATION_MESSAGES = 200  # messages traced with tracemalloc, separately from the timed run
+TOLERANCE = 0.25  # allowed fractional slowdown against the baseline
+# 10% steps from 1 us to about 1 s, so percentiles are within a few percent
+BENCH_BUCKETS_MS = [0.001 * 1.1 ** i for i in range(146)]
+STAGES = ["decode", "queue", "process", "save", "end_to_end"]
+
+
+class Message:
+    """Stand-in for paho's MQTTMessage; on_message only reads the payload."""
+
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, payload):
+        self.topic = mqtt_interface.DATA_TOPIC
+        self.payload = payload
+
+
+def scenario_name(hats, channels, degree, save):
+    return f"{hats}x{channels}_deg{degree}_{'save' if save else 'nosave'}"
+
+
+def make_config(hats, channels, degree):
+    """A config with `hats` x `channels` sensors, each calibrated with a `degree` polynomial."""
+    sensors = []
+    for hat_id in range(hats):
+        for channel_id in range(channels):
+            volts = np.linspace(0.5, 4.5, degree + 2)
+            readings = 100 * volts + 3 * volts ** degree
+            sensors.append({
+                "hatID": hat_id,
+                "channelID": channel_id,
+                "name": f"S{hat_id}_{channel_id}",
+                "unit": "psi",
+                "type": "pressure",
+                "degree": degree,
+                "calibration": [[float(v), float(r)] for v, r in zip(volts, readings)],
+            })
+    return {"MCCDAQ": sensors, "relayBoard": [], "PCA9685": [], "GPIOs": []}
+
+
+def make_payloads(hats, channels, count=64, seed=0):
+    """Pre-encoded telemetry messages shaped like the Pi's, cycled through during a run."""
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for i in range(count):
+        sensors = [
+            {"hat_id": hat_id, "channel_id": channel_id, "value": round(float(rng.uniform(0.5, 4.5)), 6), "timestamp": 1700000000.0 + i * 0.01}
+            for hat_id in range(hats) for channel_id in range(channels)
+        ]
+        payloads.append(json.dumps({"sensors": sensors}).encode('utf-8'))
+    return payloads
+
+
+def load_scenario(hats, channels, degree, save, workdir):
+    config_file = os.path.join(workdir, "configs", f"bench_{hats}x{channels}_deg{degree}.yml")
+    with open(config_file, 'w') as file:
+        yaml.safe_dump(make_config(hats, channels, degree), file)
+    config_parser.CONFIG_FILE = config_file
+    config_parser.load_config()
+    data_interface.data_store.clear()
+    data_interface.close_data_file()
+    data_interface.CALIBRATION_FLAG = True
+    data_interface.DATA_FORMAT = "csv"
+    data_interface.DATA_FILE = f"bench_{scenario_name(hats, channels, degree, save)}.csv" if save else None
+    data_interface.SAVE_DATA_FLAG = save
+
+
+class Recorder:
+    """
+    Swaps finer histograms into the instrumented modules and times each
+    message from on_message to the end of its processing. The bridge is
+    FIFO and the feeder never lets it overflow, so send times line up with
+    handled messages. `slots` limits the messages in the pipeline at once.
+    """
+
+    def __init__(self):
+        self.histograms = {stage: Histogram(BENCH_BUCKETS_MS) for stage in STAGES}
+        self.sent = collections.deque()
+        self.slots = None
+        self._handler = mqtt_interface.ingest_bridge.handler
+
+    def install(self):
+        mqtt_interface.decode_time = self.histograms["decode"]
+        data_interface.process_time = self.histograms["process"]
+        data_interface.save_time = self.histograms["save"]
+        mqtt_interface.ingest_bridge.handler = self.handle
+
+    def uninstall(self):
+        mqtt_interface.ingest_bridge.handler = self._handler
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.sent.clear()
+
+    async def handle(self, payload):
+        sent = self.sent.popleft()
+        self.histograms["queue"].observe_ns(time.perf_counter_ns() - sent)
+        try:
+            await self._handler(payload)
+        finally:
+            self.histograms["end_to_end"].observe_ns(time.perf_counter_ns() - sent)
+            self.slots.release()
+
+    def percentiles(self):
+        def us(value):
+            return None if value is None else round(value * 1000, 2)
+        return {
+            stage: {"p50_us": us(histogram.percentile(50)), "p95_us": us(histogram.percentile(95)), "p99_us": us(histogram.percentile(99))}
+            for stage, histogram in self.histograms.items() if histogram.count
+        }
+
+
+def feed(payloads, count, recorder):
+    """Call on_message from this thread, as paho's network thread would, whenever the recorder has a free slot."""
+    for i in range(count):
+        recorder.slots.acquire()
+        recorder.sent.append(time.perf_counter_ns())
+        mqtt_interface.on_message(None, None, Message(payloads[i % len(payloads)]))
+
+
+async def drain(target):
+    bridge = mqtt_interface.ingest_bridge
+    while bridge.processed + bridge.errors + bridge.dropped_overflow < target:
+        await asyncio.sleep(0.001)
+
+
+async def run_messages(payloads, count, recorder, window):
+    """Feed `count` messages from a producer thread and wait until they are processed. Returns seconds taken."""
+    bridge = mqtt_interface.ingest_bridge
+    target = bridge.processed + bridge.errors + bridge.dropped_overflow + count
+    recorder.slots = threading.Semaphore(window)
+    start = time.perf_counter()
+    producer = threading.Thread(target=feed, args=(payloads, count, recorder), name="bench-feeder")
+    producer.start()
+    await drain(target)
+    elapsed = time.perf_counter() - start
+    await asyncio.to_thread(producer.join)
+    return elapsed
+
+
+async def measure_allocations(payloads, count):
+    """
+    Average bytes allocated at the peak of handling one message, and bytes
+    still held afterwards. Runs with the bridge stopped, so each message is
+    decoded by on_message and then processed directly.
+    """
+    tracemalloc.start()
+    try:
+        transient = 0
+        start, _ = tracemalloc.get_traced_memory()
+        for i in range(count):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            mqtt_interface.on_message(None, None, Message(payloads[i % len(payloads)]))
+            await mqtt_interface.handle_telemetry(mqtt_interface.raw_data)
+            _, peak = tracemalloc.get_traced_memory()
+            transient += peak - before
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"alloc_bytes_per_msg": round(transient / count), "retained_bytes_per_msg": round((end - start) / count, 1)}
+
+
+async def run_scenario(hats, channels, degree, save, messages, workdir, recorder):
+    load_scenario(hats, channels, degree, save, workdir)
+    payloads = make_payloads(hats, channels)
+    bridge = mqtt_interface.ingest_bridge
+    await run_messages(payloads, WARMUP_MESSAGES, recorder, 1)
+    dropped, errors = bridge.dropped_overflow, bridge.errors
+    # throughput with the queue kept half full, as when the Pi outpaces the backend
+    elapsed = await run_messages(payloads, messages, recorder, bridge.maxsize // 2)
+    # latencies one message at a time, so queueing behind other messages is left out
+    recorder.reset()
+    await run_messages(payloads, messages, recorder, 1)
+    result = {
+        "messages": messages,
+        "messages_per_s": round(messages / elapsed, 1),
+        "dropped": bridge.dropped_overflow - dropped,
+        "errors": bridge.errors - errors,
+        "stages": recorder.percentiles(),
+    }
+    await bridge.stop()
+    result.update(await measure_allocations(payloads, ALLOCATION_MESSAGES))
+    bridge.start()
+    data_interface.close_data_file()
+    return result
+
+
+async def run_all(scenarios, messages):
+    bridge = mqtt_interface.ingest_bridge
+    recorder = Recorder()
+    results = {}
+    cwd = os.getcwd()
+    saved = (config_parser.CONFIG_FILE, data_interface.DATA_FILE, data_interface.SAVE_DATA_FLAG)
+    with tempfile.TemporaryDirectory(prefix="novaops-bench-") as workdir:
+        os.makedirs(os.path.join(workdir, "configs"))
+        os.makedirs(os.path.join(workdir, "logs"))
+        os.chdir(workdir)  # data files are written to logs/ relative to the working directory
+        recorder.install()
+        bridge.start()
+        try:
+            for hats, channels, degree, save in scenarios:
+                name = scenario_name(hats, channels, degree, save)
+                results[name] = await run_scenario(hats, channels, degree, save, messages, workdir, recorder)
+                print(format_result(name, results[name]), flush=True)
+        finally:
+            await bridge.stop()
+            recorder.uninstall()
+            data_interface.close_data_file()
+            os.chdir(cwd)
+            config_parser.CONFIG_FILE, data_interface.DATA_FILE, data_interface.SAVE_DATA_FLAG = saved
+    return results
+
+
+def format_result(name, result):
+    stages = " ".join(f"{stage}={values['p50_us']}/{values['p99_us']}us" for stage, values in result["stages"].items())
+    return (f"{name:<22} {result['messages_per_s']:>10.1f} msg/s  p50/p99 {stages}  "
+            f"alloc {result['alloc_bytes_per_msg']} B/msg, retained {result['retained_bytes_per_msg']} B/msg")
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regressions against the baseline: throughput or p95 latencies worse than `tolerance` allows."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["messages_per_s"] < base["messages_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['messages_per_s']} msg/s, baseline {base['messages_per_s']}")
+        for stage, values in result["stages"].items():
+            base_p95 = base.get("stages", {}).get(stage, {}).get("p95_us")
+            if base_p95 and values["p95_us"] > base_p95 * (1 + tolerance):
+                regressions.append(f"{name}: {stage} p95 {values['p95_us']} us, baseline {base_p95}")
+        if result["dropped"] or result["errors"]:
+            regressions.append(f"{name}: {result['dropped']} dropped, {result['errors']} errors")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file).get("scenarios", {})
+
+
+def save_baseline(path, results, messages):
+    baseline = {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "messages": messages,
+        "scenarios": results,
+    }
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2)
+        file.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark telemetry ingest from on_message through save_data, offline.")
+    parser.add_argument("--hats", type=int, nargs="+", default=[1, 4], help="MCCDAQ hats per message")
+    parser.add_argument("--channels", type=int, nargs="+", default=[8], help=f"channels per hat (1-{config_parser.CHANNELS_PER_HAT})")
+    parser.add_argument("--degrees", type=int, nargs="+", default=[1, 3], help="calibration polynomial degrees")
+    parser.add_argument("--save", choices=["off", "on"], nargs="+", default=["off", "on"], help="write a CSV data file")
+    parser.add_argument("--messages", type=int, default=MESSAGES, help="messages timed per scenario")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed fractional slowdown")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if any(not 1 <= channels <= config_parser.CHANNELS_PER_HAT for channels in args.channels):
+        parser.error(f"--channels must be between 1 and {config_parser.CHANNELS_PER_HAT}")
+    scenarios = [(hats, channels, degree, save == "on") for hats in args.hats for channels in args.channels
+                 for degree in args.degrees for save in args.save]
+    results = asyncio.run(run_all(scenarios, args.messages))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.update_baseline:
+        save_baseline(args.baseline, results, args.messages)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
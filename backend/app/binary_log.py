@@ -0,0 +1,106 @@
+import json
+import os
+import struct
+from datetime import timedelta
+import numpy as np
+
+MAGIC = b"NOVALOG1"
+FORMAT_VERSION = 1
+RECORD_DTYPE = np.dtype('<f8')
+CSV_CHUNK_ROWS = 4096  # records converted per chunk when exporting to CSV
+
+# File layout:
+#   MAGIC | uint32 header length | JSON header (space padded to 8 bytes) | records
+# Every record is one little-endian float64 per column, the first column being
+# seconds since the start of the test. Missing values are stored as NaN.
+
+
+def make_header(sensors):
+    """Build the file header for a list of sensor config entries."""
+    layout = {
+        "version": FORMAT_VERSION,
+        "dtype": RECORD_DTYPE.str,
+        "columns": ["Timestamp"] + [sensor["name"] for sensor in sensors],
+        "units": ["s"] + [sensor.get("unit", "") for sensor in sensors],
+    }
+    body = json.dumps(layout).encode('utf-8')
+    prefix = len(MAGIC) + 4
+    body += b" " * (-(prefix + len(body)) % RECORD_DTYPE.itemsize)
+    return MAGIC + struct.pack('<I', len(body)) + body
+
+
+def encode_record(elapsed, values):
+    """Pack one record: elapsed seconds followed by the column values."""
+    record = np.empty(len(values) + 1, dtype=RECORD_DTYPE)
+    record[0] = elapsed
+    record[1:] = values
+    return record.tobytes()
+
+
+def is_binary_log(path):
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+class BinaryLogReader:
+    """
+    Memory-mapped reader for binary data files.
+
+    Columns are exposed as strided views into the mapping, so only the pages
+    of the requested rows are ever read from disk. A partially written final
+    record (e.g. while the file is still being recorded) is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a binary data file")
+            (length,) = struct.unpack('<I', file.read(4))
+            layout = json.loads(file.read(length))
+        if layout.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported binary data file version {layout.get('version')}")
+        self.columns = layout["columns"]
+        self.units = layout["units"]
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        offset = len(MAGIC) + 4 + length
+        width = len(self.columns)
+        rows = (os.path.getsize(path) - offset) // (width * RECORD_DTYPE.itemsize)
+        if rows > 0:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=offset, shape=(rows, width))
+        else:
+            self.records = np.empty((0, width), dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return self.records.shape[0]
+
+    @property
+    def times(self):
+        return self.records[:, 0]
+
+    def column(self, name):
+        if name not in self._index:
+            raise KeyError(f"Column '{name}' not found in {self.path}")
+        return self.records[:, self._index[name]]
+
+    def row_range(self, start=None, end=None):
+        """Row slice covering elapsed times in [start, end] (seconds); times are monotonic."""
+        times = self.times
+        first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        last = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+        return first, last
+
+    def read(self, columns, start=None, end=None):
+        """Return (times, {name: values}) for the rows within [start, end]."""
+        first, last = self.row_range(start, end)
+        return self.times[first:last], {name: self.column(name)[first:last] for name in columns}
+
+    def iter_csv(self, chunk_rows=CSV_CHUNK_ROWS):
+        """Yield the file as CSV text, in the same layout save_data writes."""
+        yield "".join(f"{name}," for name in self.columns) + "\n"
+        for first in range(0, len(self), chunk_rows):
+            lines = []
+            for record in self.records[first:first + chunk_rows].tolist():
+                cells = (f"{value}," if value == value else "N/A," for value in record[1:])
+                lines.append(f"{timedelta(seconds=record[0])}," + "".join(cells) + "\n")
+            yield "".join(lines)
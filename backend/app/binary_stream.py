@@ -0,0 +1,108 @@
+import math
+import struct
+import numpy as np
+import config_parser
+import data_interface
+from broadcast import BroadcastHub
+from snapshot import encode_json
+
+PROTOCOL_VERSION = 1
+FIELDS = ["value", "avg", "stddev", "min", "max", "rate"]
+VALUE_DTYPE = np.dtype('<f4')
+
+# Frame layout (little-endian), all values float32, NaN where unavailable:
+#   uint8 version | uint8 field count | uint16 schema id | uint32 seq | float64 timestamp
+#   then one row of FIELDS per sensor, in schema order
+FRAME_HEADER = struct.Struct('<BBHId')
+
+
+class Schema:
+    """Sensor order and metadata for binary frames, sent to clients as JSON text."""
+
+    def __init__(self, schema_id, sensors):
+        self.id = schema_id
+        self.names = [sensor["name"] for sensor in sensors]
+        self.text = encode_json({
+            "type": "schema",
+            "version": PROTOCOL_VERSION,
+            "schema_id": schema_id,
+            "dtype": "float32",
+            "header_bytes": FRAME_HEADER.size,
+            "fields": FIELDS,
+            "sensors": [
+                {"name": sensor["name"], "unit": sensor.get("unit", ""), "type": sensor.get("type", "")}
+                for sensor in sensors
+            ],
+        }).decode('utf-8')
+
+
+class BinaryFrame:
+    __slots__ = ("schema", "payload")
+
+    def __init__(self, schema, payload):
+        self.schema = schema
+        self.payload = payload
+
+
+class BinaryHub(BroadcastHub):
+    """
+    Broadcast hub for the compact binary protocol.
+
+    Each client receives the schema once as a text message, then binary frames
+    of packed float32 values read straight from the history store. The schema
+    is rebuilt, and resent before the next frame, when the config is reloaded.
+    The producer must return a processed-data Snapshot.
+    """
+
+    def __init__(self, name, producer, interval=0.1):
+        super().__init__(name, producer, interval)
+        self._schema = None
+        self._schema_config = None
+        self._sent_schema = None  # schema of the last frame encoded
+        self._last_seq = None
+
+    def _get_schema(self):
+        config = config_parser.get_config()
+        if config is not self._schema_config:
+            schema_id = 0 if self._schema is None else (self._schema.id + 1) & 0xFFFF
+            self._schema = Schema(schema_id, list(config["sensors"].values()))
+            self._schema_config = config
+        return self._schema
+
+    def encode(self, snapshot):
+        schema = self._get_schema()
+        if snapshot.seq == self._last_seq and schema is self._sent_schema:
+            return None
+        self._last_seq = snapshot.seq
+        self._sent_schema = schema
+
+        values = np.full((len(schema.names), len(FIELDS)), np.nan, dtype=VALUE_DTYPE)
+        for row, name in enumerate(schema.names):
+            hist = data_interface.data_store.get(name)
+            if hist is None or len(hist) == 0:
+                continue
+            stats = data_interface.data_store.stats(name)
+            values[row] = (
+                hist.latest()[1],
+                stats.mean,
+                stats.stddev,
+                stats.min,
+                stats.max,
+                data_interface.get_rolling_rate_value(name),
+            )
+
+        sensors = snapshot.data.get("sensors", [])
+        timestamp = sensors[0].get("timestamp") if sensors else None
+        timestamp = math.nan if timestamp is None else float(timestamp)
+        header = FRAME_HEADER.pack(PROTOCOL_VERSION, len(FIELDS), schema.id, snapshot.seq & 0xFFFFFFFF, timestamp)
+        return BinaryFrame(schema, header + values.tobytes())
+
+    async def send_frames(self, websocket, queue):
+        schema = self._get_schema()
+        await self.send(websocket, schema.text)
+        while True:
+            frame = await queue.get()
+            if frame.schema is not schema:
+                schema = frame.schema
+                await self.send(websocket, schema.text)
+            await self.send(websocket, frame.payload)
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import weakref
+from metrics import registry
+
+SUBSCRIBER_QUEUE_SIZE = 2  # frames buffered per client before stale ones are dropped
+
+hubs = weakref.WeakSet()  # every live hub, for the /metrics endpoint
+
+
+class BroadcastHub:
+    """
+    Single-producer fan-out for a WebSocket stream.
+
+    While anyone is subscribed, one task calls `producer` every `interval`
+    seconds, encodes the result once and puts the same encoded frame in each
+    subscriber's bounded queue. A client that falls behind loses its oldest
+    queued frames instead of slowing the producer or the other clients.
+    """
+
+    def __init__(self, name, producer, interval=0.1, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.name = name
+        self.producer = producer  # returns the frame data, or None to skip a tick
+        self.interval = interval
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._task = None
+        self.frames = 0
+        self.dropped = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        hubs.add(self)
+
+    @property
+    def clients(self):
+        return len(self._subscribers)
+
+    def encode(self, data):
+        # producers may hand over frames that are already encoded;
+        # subclasses may return None to skip publishing this tick
+        if isinstance(data, (str, bytes)):
+            return data
+        return json.dumps(data)
+
+    def subscribe(self):
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        # the producer task exits on its own once nobody is subscribed
+        self._subscribers.discard(queue)
+
+    def publish(self, frame):
+        """Queue an encoded frame for every subscriber, dropping their stalest frame if full."""
+        self.frames += 1
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(frame)
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                data = self.producer()
+                frame = self.encode(data) if data is not None else None
+                if frame is not None:
+                    self.publish(frame)
+            except Exception as e:
+                print(f"Error producing {self.name} frame: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def serve(self, websocket, on_message=None):
+        """
+        Stream this hub's frames to an accepted WebSocket until it disconnects.
+        Text messages from the client are passed to the `on_message` coroutine.
+        """
+        queue = self.subscribe()
+        sender = asyncio.create_task(self.send_frames(websocket, queue))
+        receiver = asyncio.create_task(self._receive(websocket, on_message))
+        try:
+            done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sender.cancel()
+            receiver.cancel()
+            self.unsubscribe(queue)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                print(f"Client disconnected from {self.name}: {task.exception()!r}")
+
+    async def send(self, websocket, frame):
+        """Send one text or binary message to a client, counting what was sent."""
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+            self.bytes_sent += len(frame)
+        else:
+            await websocket.send_text(frame)
+            # isascii() is O(1) on CPython, so JSON frames are not re-encoded just to be counted
+            self.bytes_sent += len(frame) if frame.isascii() else len(frame.encode('utf-8'))
+        self.messages_sent += 1
+
+    async def send_frames(self, websocket, queue):
+        while True:
+            await self.send(websocket, await queue.get())
+
+    async def _receive(self, websocket, on_message):
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if on_message is not None and message.get("text") is not None:
+                await on_message(message["text"])
+
+
+def totals(attribute):
+    """Sum an attribute over every live hub, by hub name."""
+    values = {}
+    for hub in list(hubs):
+        values[hub.name] = values.get(hub.name, 0) + getattr(hub, attribute)
+    return values
+
+
+registry.gauge("websocket_clients", "Connected WebSocket clients, by stream", lambda: totals("clients"), label="stream")
+registry.counter_callback("websocket_frames_total", "Frames produced for WebSocket clients, by stream", lambda: totals("frames"), label="stream")
+registry.counter_callback("websocket_dropped_frames_total", "Frames dropped for clients that fell behind, by stream", lambda: totals("dropped"), label="stream")
+registry.counter_callback("websocket_messages_sent_total", "WebSocket messages sent, by stream", lambda: totals("messages_sent"), label="stream")
+registry.counter_callback("websocket_sent_bytes_total", "WebSocket payload bytes sent, by stream", lambda: totals("bytes_sent"), label="stream")
@@ -0,0 +1,70 @@
+import numpy as np
+
+DEFAULT_DEGREE = 1
+
+
+def fit_coefficients(calibration, degree=DEFAULT_DEGREE):
+    """
+    Fit a sensor's (voltage, reading) calibration points once.
+    Returns polynomial coefficients, highest power first (np.polyfit order).
+    """
+    points = np.asarray(calibration, dtype=np.float64)
+    if points.ndim != 2 or points.shape[1] != 2 or len(points) == 0:
+        raise ValueError(f"Calibration must be a list of [voltage, reading] pairs, got {calibration}")
+    if degree < 0:
+        raise ValueError(f"Calibration degree must be >= 0, got {degree}")
+    if degree >= len(points):
+        print(f"Warning: degree {degree} needs more than {len(points)} calibration points, using {len(points) - 1}")
+        degree = len(points) - 1
+    return np.polyfit(points[:, 0], points[:, 1], degree)
+
+
+class CalibrationTable:
+    """
+    Calibration polynomials of every sensor slot, compiled into one padded
+    coefficient matrix so a whole batch is calibrated with a single
+    vectorized Horner evaluation.
+
+    Row `slot` holds that slot's coefficients, highest power first, left
+    padded with zeros to the highest degree in the config. Slots without a
+    calibration get the identity polynomial, so their values pass through.
+    """
+
+    def __init__(self, sensor_table):
+        fits = [None] * len(sensor_table)
+        for slot, sensor in enumerate(sensor_table):
+            if sensor is not None and sensor.get("calibration"):
+                fits[slot] = fit_coefficients(sensor["calibration"], sensor.get("degree", DEFAULT_DEGREE))
+        width = max([len(fit) for fit in fits if fit is not None] + [2])
+        self.coefficients = np.zeros((len(sensor_table), width))
+        self.coefficients[:, -2] = 1.0  # identity: 1*x + 0
+        self.calibrated = np.zeros(len(sensor_table), dtype=bool)
+        for slot, fit in enumerate(fits):
+            if fit is not None:
+                self.coefficients[slot] = 0.0
+                self.coefficients[slot, width - len(fit):] = fit
+                self.calibrated[slot] = True
+
+    @property
+    def degree(self):
+        return self.coefficients.shape[1] - 1
+
+    def apply(self, slots, values):
+        """Calibrate `values` read from sensor `slots` (equal-length arrays)."""
+        rows = self.coefficients[np.asarray(slots, dtype=np.intp)]
+        x = np.asarray(values, dtype=np.float64)
+        result = rows[:, 0].copy()
+        for k in range(1, rows.shape[1]):
+            result *= x
+            result += rows[:, k]
+        return result
+
+    def evaluate(self, slot, value):
+        """Calibrate a single reading."""
+        return float(self.apply([slot], [value])[0])
+
+    def coefficients_of(self, slot):
+        """A slot's coefficients without the zero padding, highest power first."""
+        row = self.coefficients[slot]
+        nonzero = np.flatnonzero(row)
+        return row[nonzero[0]:].tolist() if len(nonzero) else [0.0]
@@ -1,8 +1,12 @@
 import time
-import asyncio
 from datetime import datetime
 import config_parser
+import command_table
+import command_tracker
 import mqtt_interface
+import compression
+from log_writer import BufferedWriter
+from sequencer import Sequencer, Timeline, powered_timeline
 
 LOG_FILE = None
 SAVE_LOG_FLAG = False
@@ -10,51 +14,31 @@ test_start = datetime.now()
 file_num = 0
 file_length = 0
 actuator_states = {}
+log_writer = None  # BufferedWriter for LOG_FILE
 
 def new_log_file():
-    global file_num, LOG_FILE
+    global file_num, LOG_FILE, log_writer
+    close_log_file()
     date = datetime.now().strftime("%Y-%m-%d-%H")
     LOG_FILE = f"{date}_log_{file_num}.csv"
-
-    with open(f"logs/{LOG_FILE}", 'w') as file:
-        file.write("Timestamp,")
-        file.write("Name,")
-        file.write("State,")
-        """
-        for actuator in config_parser.get_actuators_config():
-            file.write(f"{actuator['name']},") 
-        """
-        file.write("\n")
+    log_writer = BufferedWriter(f"logs/{LOG_FILE}", header="Timestamp,Name,State,\n")
     file_num += 1
     return
 
+def close_log_file():
+    """Flush and close the command log writer, if one is open."""
+    global log_writer
+    if log_writer is not None:
+        log_writer.close()
+        compression.compress_in_background(log_writer.path)
+        log_writer = None
+
 def save_log(command):
     """Save actuator states to a CSV file."""
-    #if LOG_FILE is None:
-    #    new_log_file()
-    if LOG_FILE is not None:
-        with open(f"logs/{LOG_FILE}", 'a') as file:
-            # write a global LOG_FILE to the file
-            now = datetime.now()
-            timedelta = now-test_start
-            timestamp = str(timedelta)
-            file.write(f"{timestamp},")
-            file.write(f"{command['name']},")
-            file.write(f"{command['state']},")
-            """
-            for actuator in config_parser.get_actuators_config():
-                name = actuator["name"]
-                if name in actuator_states:
-                    state = actuator_states[name]
-                    if state is not None:
-                        file.write(f"{state},")
-                    else:
-                        file.write("N/A,")
-                else:
-                    file.write("N/A,")
-            """
-            
-            file.write("\n")
+    if LOG_FILE is not None and log_writer is not None:
+        # write a global timestamp to the file
+        timestamp = str(datetime.now() - test_start)
+        log_writer.write(f"{timestamp},{command['name']},{command['state']},\n")
 
 
 def update_actuator_state(name, state):
@@ -75,6 +59,9 @@ def update_actuator_state(name, state):
     except Exception as e:
         print(f"Error updating actuator state: {e}")
     
+# Telemetry confirming a command (or reporting a state) updates actuator_states
+command_tracker.tracker.listeners.append(update_actuator_state)
+
 def initialize_actuator_states():
     for actuator in config_parser.get_actuators_config():
         name = actuator["name"]
@@ -115,385 +102,149 @@ async def validate_command(command):
 
 async def convert_command(command):
     """
-    Convert and send command values based on config.yml values.
+    Convert a command to the MQTT commands it sends, based on config.yml values.
     """
-    # print(f"Received command: {command}")
-    config = config_parser.get_config()  # Load the configuration
-    command_type = command["type"]
-    name = command["name"]
-    state = command["state"]
-    
-    if command_type in ["poweredDevice"] and state in ["on", "off"]:
-        # Find the relay by name
-        relay = next((r for r in config["relays"].values() if r["name"] == name), None)
-        if not relay:
-            print(f"Relay with name '{name}' not found in config.")
-            raise ValueError(f"Relay with name '{name}' not found in config.")
-        
-        relay_state = 0 if (state == "on" and  relay["relay_type"] == "NO" ) or (state == "off" and relay["relay_type"] == "NC") else 1
-        
-        # Create the command
-        relay_command = {
-            "type": "relay",
-            "id": relay["channelID"],
-            "state": relay_state
-        }
-        return [relay_command]
-    
-    elif command_type in ["gpioDevice", "poweredGpioDevice"]:
-        # Find the GPIO by name
-        gpio = next((g for g in config["gpios"].values() if g["name"] == name), None)
-        if not gpio:
-            raise ValueError(f"GPIO with name '{name}' not found in config.")
-        
-        if state in ["on", "off"]:
-            relay_state = 0 if (state == "on") else 1
-            if "relayID" in gpio:
-                relay_command = {
-                    "type": "relay",
-                    "id": gpio["relayID"],
-                    "state": relay_state
-                }
-                return [relay_command]
-
-        if state  in ["armed", "disarmed"]:
-            # Convert state to GPIO state
-            gpio_state = 1 if state == "armed" else 0
-            
-            # Create the command
-            gpio_command = {
-                "type": "gpio",
-                "id": gpio["pinID"],
-                "mode": "output",
-                "state": gpio_state
-            }
-            return [gpio_command]
-    
-    elif command_type == "solenoid":
-        # Find the relay by name
-        relay = next((r for r in config["relays"].values() if r["name"] == name), None)
-        if not relay:
-            print(f"Relay with name '{name}' not found in config.")
-            raise ValueError(f"Relay with name '{name}' not found in config.")
+    try:
+        return command_table.convert(config_parser.get_config(), command["type"], command["name"], command["state"])
+    except ValueError as e:
+        print(e)
+        raise
 
-        relay_type = relay.get("relay_type", None)
-        if relay_type is None:
-            print(f"Relay '{name}' does not have a 'relay_type' defined.")
-            raise ValueError(f"Relay '{name}' does not have a 'relay_type' defined.")
-        elif relay_type not in ["NO", "NC"]:
-            print(f"Invalid relay type '{relay_type}' for relay '{name}'.")
-            raise ValueError(f"Invalid relay type '{relay_type}' for relay '{name}'.")
-        
-        solenoid_type = relay["solenoid_type"]
-        if solenoid_type is None:
-            print(f"Relay '{name}' does not have a 'solenoid_type' defined.")
-            raise ValueError(f"Relay '{name}' does not have a 'solenoid_type' defined.")
-        elif solenoid_type not in ["NO", "NC"]:
-            print(f"Invalid solenoid type '{solenoid_type}' for relay '{name}'.")
-            raise ValueError(f"Invalid solenoid type '{solenoid_type}' for relay '{name}'.")
-        
-        # Convert state based on relay type
-        relay_state = None
-        """
-        if state == "open":
-            # Convert state based on relay type
-            if solenoid_type == "NO":
-                relay_state = 0 if relay_type == "NO" else 1
-            elif solenoid_type == "NC":
-                relay_state = 1 if relay_type == "NO" else 0
-        elif state == "closed":
-            if solenoid_type == "NO":
-                relay_state = 1 if relay_type == "NO" else 0
-            elif solenoid_type == "NC":
-                relay_state = 0 if relay_type == "NO" else 1
-        """
-        power_state = "on" if (state == "open" and solenoid_type == "NC") or (state == "closed" and solenoid_type == "NO") else "off"
-        relay_state = 0 if (power_state == "on" and  relay_type == "NO" ) or (power_state == "off" and relay_type == "NC") else 1
-        
-        if relay_state is None:
-            print(f"Invalid state '{state}' for relay '{name}'.")
-            raise ValueError(f"Invalid state '{state}' for relay '{name}'.")
-        
-        # Create the command
-        relay_command = {
-            "type": "relay",
-            "id": relay["channelID"],
-            "state": relay_state
-        }
+def command_payloads(command):
+    """
+    The pre-serialized MQTT payloads for a command, from the table compiled
+    at config load. Commands missing from it go through convert_command's
+    checks, which raise a ValueError describing what is wrong.
+    """
+    payloads = config_parser.get_command_table().get((command["type"], command["name"], command["state"]))
+    if payloads is not None:
+        return payloads
+    try:
+        mqtt_commands = command_table.convert(config_parser.get_config(), command["type"], command["name"], command["state"])
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"Incomplete config for {command['type']} '{command['name']}': {e}")
+    return command_table.encode_payloads(mqtt_commands)
 
-        return [relay_command]
     
-    elif command_type in ["servo", "servo2", "servo3"]:
-        mqtt_commands = []
-        relay_state = None
-        angle = None
-        # Find the servo by name
-        servo = next((s for s in config["servos"].values() if s["name"] == name), None)
-        if not servo:
-            raise ValueError(f"Servo with name '{name}' not found in config.")
-
-        # Determine the angle based on state
-        """
-        if state == "open":
-            angle = servo["open_pos"]
-            over_angle = servo.get("open_over")
-        elif state == "closed":
-            angle = servo["close_pos"]
-            over_angle = servo.get("close_over")
-        """
-        if state in ["open", "closed"]:
-            angle = servo["open_pos"] if state == "open" else servo["close_pos"]
-            over_angle = servo.get("open_over") if state == "open" else servo.get("close_over")
-        elif state in servo["position_aliases"] or state in  ['1', '2', '3']:
-            # If the state is a position alias, get the index of the alias
-            if state in servo["position_aliases"]:
-                index = servo["position_aliases"].index(state)
-                if index < len(servo["positions"]):
-                    angle = servo["positions"][index]
-            elif state in ['1', '2', '3']:
-                angle = servo["positions"][int(state)-1] 
-            servo_command = {
-                "type": "servo",
-                "id": servo["channelID"],
-                "angle": angle
-            }
-            return [servo_command]
-        elif state in ["on", "off"]:
-            relay_state = 0 if (state == "on") else 1
-            if "relayID" in servo:
-                relay_command = {
-                    "type": "relay",
-                    "id": servo["relayID"],
-                    "state": relay_state
-                }
-                return [relay_command]
+def schedule(relay_commands, powered_commands, direct_commands):
+    """
+    Turn actuator commands into independent timelines for the sequencer.
+
+    relay_commands are (name, channelID, command) for solenoids and powered
+    devices, powered_commands are (name, relayID, command) for servos and
+    GPIOs that need their relay on to move, and direct_commands are
+    (name, command) for ones that do not. Actuators sharing a power relay
+    share one timeline, and a relay command on a channel that also powers
+    other actuators is sent after their timeline cuts power.
+    """
+    groups = {}  # relayID -> ([names], [commands])
+    for name, relay_id, command in powered_commands:
+        names, commands = groups.setdefault(relay_id, ([], []))
+        names.append(name)
+        commands.append(command)
+    after = {}
+    timelines = []
+    for name, channel_id, command in relay_commands:
+        if channel_id in groups:
+            after.setdefault(channel_id, []).append(command)
         else:
-            raise ValueError(f"Invalid state '{state}' for servo.")
-
-
-        # If over position exists, send the over position first
-        if over_angle:
-            over_command = {
-                "type": "servo",
-                "id": servo["channelID"],
-                "angle": over_angle
-            }
-            mqtt_commands.append(over_command)
+            timelines.append(Timeline(name, [("send", command)]))
+    timelines += [Timeline(name, [("send", command)]) for name, command in direct_commands]
+    for relay_id, (names, commands) in groups.items():
+        timelines.append(powered_timeline("+".join(names), relay_id, commands, after=after.get(relay_id, [])))
+    return timelines
 
-        if angle:
-            # Send the actual position command
-            servo_command = {
-                "type": "servo",
-                "id": servo["channelID"],
-                "angle": angle
-            }
-            mqtt_commands.append(servo_command)
+def check_relay_type(relay):
+    if relay.get("relay_type") not in ["NO", "NC"]:
+        raise ValueError(f"Invalid relay type '{relay.get('relay_type')}' for relay '{relay['name']}'.")
 
-        return mqtt_commands
-    else:
-        raise ValueError(f"Invalid command type '{command_type}'.")
-
-    
 async def set_all_to_closed():
-    """Set all servos and solenoids to their closed state."""
+    """
+    Set all servos and solenoids to their closed state, and power off powered
+    devices. Servos with no close_pos (e.g. 3-way valves) are listed as skipped.
+    """
     config = config_parser.get_config()
-    commands = []
-    wait = {"wait"}
+    relay_commands, powered_commands, direct_commands = [], [], []
+    skipped = []
     for servo in config["servos"].values():
-        name = servo["name"]
-        command = {
-        "type": "servo",
-        "id": servo["channelID"],
-        "angle": servo["close_pos"]
-        }
+        if "close_pos" not in servo:
+            skipped.append(servo["name"])
+            continue
+        command = {"type": "servo", "id": servo["channelID"], "angle": servo["close_pos"]}
         if "relayID" in servo:
-            power_on = {
-                "type": "relay",
-                "id": servo["relayID"],
-                "state": 0
-            }
-            power_off = {
-                "type": "relay",
-                "id": servo["relayID"],
-                "state": 1
-            }
-            commands.append(power_on)
-            commands.append(wait)
-            commands.append(command)
-            commands.append(wait)
-            commands.append(power_off)
+            powered_commands.append((servo["name"], servo["relayID"], command))
         else:
-            commands.append(command)
+            direct_commands.append((servo["name"], command))
     for relay in config["relays"].values():
-        # Send commands to set all solenoids to their default state
-        if relay["actuator_type"] == "solenoid":
-            name = relay["name"]
-            relay_type = relay["relay_type"]
-            solenoid_type = relay["solenoid_type"]
-
-            if relay_type not in ["NO", "NC"]:
-                raise ValueError(f"Invalid relay type '{relay_type}' for relay '{name}'.")
-            if solenoid_type not in ["NO", "NC"]:
-                raise ValueError(f"Invalid solenoid type '{solenoid_type}' for relay '{name}'.")
-            
-            relay_state = 0 if (solenoid_type == "NO" and  relay_type == "NO" ) or (solenoid_type == "NC" and relay_type == "NC") else 1
-            command = {
-                "type": "relay",
-                "id": relay["channelID"],
-                "state": relay_state
-            }
-            commands.append(command)
-        if relay["actuator_type"] == "poweredDevice":
-            name = relay["name"]
-            relay_type = relay["relay_type"]
-
-            if relay_type not in ["NO", "NC"]:
-                raise ValueError(f"Invalid relay type '{relay_type}' for relay '{name}'.")
-
-            relay_state = 0 if (relay_type == "NC") else 1
-            command = {
-                "type": "relay",
-                "id": relay["channelID"],
-                "state": relay_state
-            }
-            commands.append(command)
-    
-    for command in commands:
-        if command == wait:
-            await asyncio.sleep(2)
+        # Closed solenoids, and powered devices switched off
+        if relay.get("actuator_type") == "solenoid":
+            state = "closed"
+        elif relay.get("actuator_type") == "poweredDevice":
+            check_relay_type(relay)
+            state = "off"
         else:
-            await mqtt_interface.publish_command(command)
-            await asyncio.sleep(0.1)  # Add a small delay between commands to avoid flooding the broker
-    return {"status": "Commands sent"}
+            continue
+        for command in command_table.convert(config, relay["actuator_type"], relay["name"], state):
+            relay_commands.append((relay["name"], relay["channelID"], command))
+
+    duration = await Sequencer(mqtt_interface.publish_command, config_parser.get_power_budgets()).run(schedule(relay_commands, powered_commands, direct_commands))
+    return {"status": "Commands sent", "duration": round(duration, 2), "skipped": skipped}
 
 async def set_to_defaults():
-    """Set all actuators to their default state."""
+    """
+    Set all actuators to their default_state. Actuators without one are
+    left as they are and listed as skipped.
+    """
     config = config_parser.get_config()
-    commands = []
-    wait = {"wait"}
+    relay_commands, powered_commands, direct_commands = [], [], []
+    skipped = []
     for servo in config["servos"].values():
-        # Send commands to set all servos to their default state
         name = servo["name"]
-        default_state = servo["default_state"]
-
+        default_state = servo.get("default_state")
         if default_state is None:
-            raise ValueError(f"Default state not defined for servo '{name}'.")
-                
-        if default_state == "open":
-            angle = servo["open_pos"]
-        elif default_state == "closed":
-            angle = servo["close_pos"]
-            
-        command = {
-        "type": "servo",
-        "id": servo["channelID"],
-        "angle": angle
-        }
+            skipped.append(name)
+            continue
+        if default_state in ["open", "closed"]:
+            angle = servo["open_pos"] if default_state == "open" else servo["close_pos"]
+        elif default_state in servo.get("position_aliases", []):
+            angle = servo["positions"][servo["position_aliases"].index(default_state)]
+        else:
+            raise ValueError(f"Invalid default state '{default_state}' for servo '{name}'.")
+        command = {"type": "servo", "id": servo["channelID"], "angle": angle}
         if "relayID" in servo:
-            power_on = {
-                "type": "relay",
-                "id": servo["relayID"],
-                "state": 0
-            }
-            power_off = {
-                "type": "relay",
-                "id": servo["relayID"],
-                "state": 1
-            }
-        
-        if power_on: 
-            commands.append(power_on)
-            commands.append(wait)
-        
-        commands.append(command)
+            powered_commands.append((name, servo["relayID"], command))
+        else:
+            direct_commands.append((name, command))
 
-        if power_off: 
-            commands.append(wait)
-            commands.append(power_off)
-        
     for gpio in config["gpios"].values():
-        # Send commands to set all GPIOs to their default state
         name = gpio["name"]
-        default_state = gpio["default_state"]
-
+        default_state = gpio.get("default_state")
         if default_state is None:
-            raise ValueError(f"Default state not defined for GPIO '{name}'.")
-
-        if default_state == "armed":
-            state = 1
-        elif default_state == "disarmed":
-            state = 0
-        
+            skipped.append(name)
+            continue
+        if default_state not in ["armed", "disarmed"]:
+            raise ValueError(f"Invalid default state '{default_state}' for GPIO '{name}'.")
+        command = {"type": "gpio", "id": gpio["pinID"], "mode": "output", "state": 1 if default_state == "armed" else 0}
         if "relayID" in gpio:
-            power_on = {
-                "type": "relay",
-                "id": gpio["relayID"],
-                "state": 0
-            }
-            power_off = {
-                "type": "relay",
-                "id": gpio["relayID"],
-                "state": 1
-            }
-        command = {
-            "type": "gpio",
-            "id": gpio["channelID"],
-            "state": state
-        }
-        if power_on: 
-            commands.append(power_on)
-            commands.append(wait)
-        
-        commands.append(command)
-
-        if power_off: 
-            commands.append(wait)
-            commands.append(power_off)
+            powered_commands.append((name, gpio["relayID"], command))
+        else:
+            direct_commands.append((name, command))
 
     for relay in config["relays"].values():
-        # Send commands to set all solenoids to their default state
-        if relay["actuator_type"] == "solenoid":
-            name = relay["name"]
-            relay_type = relay["relay_type"]
-            solenoid_type = relay["solenoid_type"]
-            default_state = relay["default_state"]
-
-            if relay_type not in ["NO", "NC"]:
-                raise ValueError(f"Invalid relay type '{relay_type}' for relay '{name}'.")
-            if solenoid_type not in ["NO", "NC"]:
-                raise ValueError(f"Invalid solenoid type '{solenoid_type}' for relay '{name}'.")
-            if default_state not in ["open", "closed"]:
-                raise ValueError(f"Invalid default state '{default_state}' for relay '{name}'.")
-            
-            power_state = "on" if (default_state == "open" and solenoid_type == "NC") or (default_state == "closed" and solenoid_type == "NO") else "off"
-            relay_state = 0 if (power_state == "on" and  relay_type == "NO" ) or (power_state == "off" and relay_type == "NC") else 1
-            command = {
-                "type": "relay",
-                "id": relay["channelID"],
-                "state": relay_state
-            }
-            commands.append(command)
-        if relay["actuator_type"] == "poweredDevice":
-            name = relay["name"]
-            relay_type = relay["relay_type"]
-            default_state = relay["default_state"]
-
-            if relay_type not in ["NO", "NC"]:
-                raise ValueError(f"Invalid relay type '{relay_type}' for relay '{name}'.")
-            if default_state not in ["on", "off"]:
-                raise ValueError(f"Invalid default state '{default_state}' for relay '{name}'.")
-
-            relay_state = 0 if (default_state == "on" and  relay_type == "NO" ) or (default_state == "off" and relay_type == "NC") else 1
-            command = {
-                "type": "relay",
-                "id": relay["channelID"],
-                "state": relay_state
-            }
-            commands.append(command)
-    
-    for command in commands:
-        if command == wait:
-            await asyncio.sleep(2)
-        else:
-            await mqtt_interface.publish_command(command)
-            await asyncio.sleep(0.1)
\ No newline at end of file
+        actuator_type = relay.get("actuator_type")
+        if actuator_type not in ["solenoid", "poweredDevice"]:
+            continue
+        name = relay["name"]
+        default_state = relay.get("default_state")
+        if default_state is None:
+            skipped.append(name)
+            continue
+        valid_states = ["open", "closed"] if actuator_type == "solenoid" else ["on", "off"]
+        if default_state not in valid_states:
+            raise ValueError(f"Invalid default state '{default_state}' for relay '{name}'.")
+        check_relay_type(relay)
+        for command in command_table.convert(config, actuator_type, name, default_state):
+            relay_commands.append((name, relay["channelID"], command))
+
+    duration = await Sequencer(mqtt_interface.publish_command, config_parser.get_power_budgets()).run(schedule(relay_commands, powered_commands, direct_commands))
+    return {"status": "Default commands sent", "duration": round(duration, 2), "skipped": skipped}
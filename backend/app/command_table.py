@@ -0,0 +1,139 @@
+import json
+from types import MappingProxyType
+
+RELAY_COMMAND_TYPES = {"solenoid": ["open", "closed"], "poweredDevice": ["on", "off"]}
+GPIO_COMMAND_TYPES = ["gpioDevice", "poweredGpioDevice"]
+GPIO_STATES = ["on", "off", "armed", "disarmed"]
+SERVO_COMMAND_TYPES = ["servo", "servo2", "servo3"]
+SERVO_STATES = ["open", "closed", "on", "off", "1", "2", "3"]
+
+
+def by_name(items):
+    """Map names to config entries, keeping the first entry with each name."""
+    named = {}
+    for item in items:
+        named.setdefault(item["name"], item)
+    return named
+
+
+def convert(config, command_type, name, state, names=None):
+    """
+    Convert an actuator command to the list of MQTT commands the Pi expects,
+    based on the config. `names` is the config's (relays, gpios, servos)
+    name maps, built from `config` if not given.
+    """
+    relays, gpios, servos = names or (by_name(config["relays"].values()), by_name(config["gpios"].values()), by_name(config["servos"].values()))
+
+    if command_type in ["poweredDevice"] and state in ["on", "off"]:
+        relay = relays.get(name)
+        if not relay:
+            raise ValueError(f"Relay with name '{name}' not found in config.")
+
+        relay_state = 0 if (state == "on" and  relay["relay_type"] == "NO" ) or (state == "off" and relay["relay_type"] == "NC") else 1
+        return [{"type": "relay", "id": relay["channelID"], "state": relay_state}]
+
+    elif command_type in ["gpioDevice", "poweredGpioDevice"]:
+        gpio = gpios.get(name)
+        if not gpio:
+            raise ValueError(f"GPIO with name '{name}' not found in config.")
+
+        if state in ["on", "off"]:
+            relay_state = 0 if (state == "on") else 1
+            if "relayID" in gpio:
+                return [{"type": "relay", "id": gpio["relayID"], "state": relay_state}]
+
+        if state in ["armed", "disarmed"]:
+            gpio_state = 1 if state == "armed" else 0
+            return [{"type": "gpio", "id": gpio["pinID"], "mode": "output", "state": gpio_state}]
+        raise ValueError(f"Invalid state '{state}' for GPIO '{name}'.")
+
+    elif command_type == "solenoid":
+        relay = relays.get(name)
+        if not relay:
+            raise ValueError(f"Relay with name '{name}' not found in config.")
+
+        relay_type = relay.get("relay_type", None)
+        if relay_type is None:
+            raise ValueError(f"Relay '{name}' does not have a 'relay_type' defined.")
+        elif relay_type not in ["NO", "NC"]:
+            raise ValueError(f"Invalid relay type '{relay_type}' for relay '{name}'.")
+
+        solenoid_type = relay.get("solenoid_type", None)
+        if solenoid_type is None:
+            raise ValueError(f"Relay '{name}' does not have a 'solenoid_type' defined.")
+        elif solenoid_type not in ["NO", "NC"]:
+            raise ValueError(f"Invalid solenoid type '{solenoid_type}' for relay '{name}'.")
+        if state not in ["open", "closed"]:
+            raise ValueError(f"Invalid state '{state}' for relay '{name}'.")
+
+        # Power the solenoid to move it away from its resting position, then
+        # drive the relay so its contacts give that power state
+        power_state = "on" if (state == "open" and solenoid_type == "NC") or (state == "closed" and solenoid_type == "NO") else "off"
+        relay_state = 0 if (power_state == "on" and  relay_type == "NO" ) or (power_state == "off" and relay_type == "NC") else 1
+        return [{"type": "relay", "id": relay["channelID"], "state": relay_state}]
+
+    elif command_type in ["servo", "servo2", "servo3"]:
+        servo = servos.get(name)
+        if not servo:
+            raise ValueError(f"Servo with name '{name}' not found in config.")
+
+        if state in ["open", "closed"]:
+            angle = servo["open_pos"] if state == "open" else servo["close_pos"]
+            over_angle = servo.get("open_over") if state == "open" else servo.get("close_over")
+        elif state in servo.get("position_aliases", []) or state in ['1', '2', '3']:
+            angle = None
+            if state in servo.get("position_aliases", []):
+                index = servo["position_aliases"].index(state)
+                if index < len(servo["positions"]):
+                    angle = servo["positions"][index]
+            else:
+                angle = servo["positions"][int(state)-1]
+            return [{"type": "servo", "id": servo["channelID"], "angle": angle}]
+        elif state in ["on", "off"]:
+            relay_state = 0 if (state == "on") else 1
+            if "relayID" not in servo:
+                raise ValueError(f"Servo '{name}' does not have a relayID for 'on'/'off' state.")
+            return [{"type": "relay", "id": servo["relayID"], "state": relay_state}]
+        else:
+            raise ValueError(f"Invalid state '{state}' for servo.")
+
+        mqtt_commands = []
+        # If over position exists, send the over position first
+        if over_angle:
+            mqtt_commands.append({"type": "servo", "id": servo["channelID"], "angle": over_angle})
+        if angle:
+            mqtt_commands.append({"type": "servo", "id": servo["channelID"], "angle": angle})
+        return mqtt_commands
+    else:
+        raise ValueError(f"Invalid command type '{command_type}'.")
+
+
+def encode_payloads(mqtt_commands):
+    """Serialize MQTT commands once, as the bytes published to the broker."""
+    return tuple(json.dumps(command).encode('utf-8') for command in mqtt_commands)
+
+
+def build_command_table(config):
+    """
+    Compile every valid (type, name, state) command in the config to its
+    tuple of pre-serialized MQTT payloads. Commands that do not convert
+    are left out, so looking them up falls back to convert() and its error.
+    """
+    names = (by_name(config["relays"].values()), by_name(config["gpios"].values()), by_name(config["servos"].values()))
+    relays, gpios, servos = names
+    keys = []
+    for name in relays:
+        keys += [(command_type, name, state) for command_type, states in RELAY_COMMAND_TYPES.items() for state in states]
+    for name in gpios:
+        keys += [(command_type, name, state) for command_type in GPIO_COMMAND_TYPES for state in GPIO_STATES]
+    for name, servo in servos.items():
+        states = SERVO_STATES + [alias for alias in servo.get("position_aliases", []) if alias not in SERVO_STATES]
+        keys += [(command_type, name, state) for command_type in SERVO_COMMAND_TYPES for state in states]
+
+    table = {}
+    for key in keys:
+        try:
+            table[key] = encode_payloads(convert(config, *key, names=names))
+        except (ValueError, KeyError, IndexError, TypeError):
+            continue  # incomplete config entry; reported when the command is sent
+    return MappingProxyType(table)
@@ -0,0 +1,191 @@
+import json
+import time
+from metrics import Histogram
+
+CONFIRM_TIMEOUT = 10.0  # seconds to wait for telemetry confirming a command
+
+
+def _same(reported, expected):
+    return reported == expected or str(reported) == str(expected)
+
+
+class PendingCommand:
+    """
+    A command waiting for telemetry to confirm it. `expected` maps each
+    (type, id) the command's MQTT payloads address to the final state or
+    angle it should report. `armed` holds the keys whose next report of
+    that value is a transition caused by the command, rather than a stale
+    report of the state it was already in.
+    """
+
+    def __init__(self, name, state, payloads, started):
+        self.name = name
+        self.state = state
+        self.started = started
+        self.acked = None
+        self.expected = {}
+        for payload in payloads:
+            command = json.loads(payload)
+            self.expected[(command.get("type"), command.get("id"))] = command.get("angle", command.get("state"))
+        self.confirmed = set()
+        self.armed = set()
+        self.name_armed = False  # same, for reports of the actuator by name
+
+    def info(self, now):
+        return {
+            "name": self.name,
+            "state": self.state,
+            "age_ms": round((now - self.started) * 1000, 2),
+            "acked": self.acked is not None,
+            "confirmed": f"{len(self.confirmed)}/{len(self.expected)}",
+        }
+
+
+class CommandTracker:
+    """
+    Correlates commands with the telemetry that confirms them.
+
+    A command is confirmed once every relay/servo/GPIO it addressed has
+    reported its commanded value, or the actuator itself has reported the
+    commanded state by name, as a transition: after reporting a different
+    value, or after the broker acknowledged the command if nothing had been
+    reported before it. Telemetry already in flight when the command was
+    sent therefore cannot confirm it. A command for an actuator whose last
+    report already matches is counted as already_in_state and not tracked.
+    Per actuator, the time from the command request to the broker's
+    acknowledgement and to confirmation go into latency histograms
+    (milliseconds).
+
+    Telemetry actuator reports are read from raw_data["actuators"], either
+    by hardware ({"type": "relay", "id": 3, "state": 0}, servos with "angle")
+    or by name ({"name": "SVFTV", "state": "open"}).
+    """
+
+    def __init__(self, timeout=CONFIRM_TIMEOUT):
+        self.timeout = timeout
+        self.pending = {}  # actuator name -> its latest unconfirmed command
+        self.round_trip = {}  # actuator name -> Histogram of request -> telemetry confirmation
+        self.ack = {}  # actuator name -> Histogram of request -> broker acknowledgement
+        self.listeners = []  # called with (name, state) when telemetry confirms or reports a state
+        self.last = {}  # actuator name or (type, id) -> latest reported state or angle
+        self.confirmed = 0
+        self.unconfirmed = 0
+        self.superseded = 0
+        self.already_in_state = 0
+
+    def track(self, name, state, payloads, started=None):
+        """Start tracking a command before it is published. Returns its PendingCommand."""
+        pending = PendingCommand(name, state, payloads, time.monotonic() if started is None else started)
+        if self.pending.pop(name, None) is not None:
+            self.superseded += 1
+        for key, value in pending.expected.items():
+            if key not in self.last:
+                continue  # armed once the broker acknowledges the command
+            if _same(self.last[key], value):
+                pending.confirmed.add(key)  # already there; it will not report a transition
+            else:
+                pending.armed.add(key)
+        if name in self.last and not _same(self.last[name], state):
+            pending.name_armed = True
+        elif name in self.last or (pending.expected and len(pending.confirmed) == len(pending.expected)):
+            self.already_in_state += 1  # nothing will change, so there is no latency to measure
+            return pending
+        self.pending[name] = pending
+        return pending
+
+    def acknowledged(self, pending, tickets):
+        """Record when the broker acknowledged the last of a command's payloads."""
+        times = [ticket.acked for ticket in tickets if ticket.acked is not None]
+        if not times:
+            return
+        pending.acked = max(times)
+        # Reports from here on may follow the command, so keys with no report yet can confirm it.
+        # Keys that first reported their commanded value before this were already there.
+        for key in pending.expected:
+            if key not in pending.armed and key not in pending.confirmed:
+                (pending.confirmed if key in self.last else pending.armed).add(key)
+        if (not pending.name_armed and pending.name in self.last) or len(pending.confirmed) == len(pending.expected):
+            if self.pending.get(pending.name) is pending:
+                del self.pending[pending.name]
+                self.already_in_state += 1
+        pending.name_armed = True
+        self.ack.setdefault(pending.name, Histogram()).observe((pending.acked - pending.started) * 1000)
+
+    def observe(self, raw_data, now=None):
+        """Check one decoded telemetry message for confirmations."""
+        now = time.monotonic() if now is None else now
+        self.expire(now)
+        reports = raw_data.get("actuators") if isinstance(raw_data, dict) else None
+        if not isinstance(reports, list):
+            return
+        for report in reports:
+            if not isinstance(report, dict):
+                continue
+            name = report.get("name")
+            state = report.get("state", report.get("status"))
+            if name is not None and state is not None:
+                self.last[name] = state
+                self._notify(name, state)
+                pending = self.pending.get(name)
+                if pending is not None:
+                    if not _same(state, pending.state):
+                        pending.name_armed = True
+                    elif pending.name_armed:
+                        self._confirm(pending, now)
+                continue
+            key = (report.get("type"), report.get("id"))
+            value = report.get("angle", state)
+            self.last[key] = value
+            for pending in list(self.pending.values()):
+                if key not in pending.expected or key in pending.confirmed:
+                    continue
+                if not _same(value, pending.expected[key]):
+                    pending.armed.add(key)
+                elif key in pending.armed:
+                    pending.confirmed.add(key)
+                    if len(pending.confirmed) == len(pending.expected):
+                        self._confirm(pending, now)
+
+    def _confirm(self, pending, now):
+        if self.pending.get(pending.name) is not pending:
+            return
+        del self.pending[pending.name]
+        self.confirmed += 1
+        self.round_trip.setdefault(pending.name, Histogram()).observe((now - pending.started) * 1000)
+        self._notify(pending.name, pending.state)
+
+    def _notify(self, name, state):
+        for listener in self.listeners:
+            try:
+                listener(name, state)
+            except Exception as e:
+                print(f"Error updating actuator state: {e}")
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        for name, pending in list(self.pending.items()):
+            if now - pending.started > self.timeout:
+                del self.pending[name]
+                self.unconfirmed += 1
+
+    def report(self):
+        now = time.monotonic()
+        self.expire(now)
+        names = sorted(set(self.round_trip) | set(self.ack))
+        return {
+            "confirmed": self.confirmed,
+            "unconfirmed": self.unconfirmed,
+            "superseded": self.superseded,
+            "already_in_state": self.already_in_state,
+            "pending": [pending.info(now) for pending in self.pending.values()],
+            "actuators": {
+                name: {
+                    "ack_ms": self.ack[name].summary() if name in self.ack else None,
+                    "round_trip_ms": self.round_trip[name].summary() if name in self.round_trip else None,
+                }
+                for name in names
+            },
+        }
+
+
+tracker = CommandTracker()
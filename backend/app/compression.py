@@ -0,0 +1,120 @@
+import os
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd downloads are only offered when it is installed
+    zstandard = None
+
+CHUNK_SIZE = 64 * 1024  # bytes read from a log file per chunk
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COMPRESS_CLOSED_LOGS = False  # compress data and command logs in the background once closed
+
+EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+MEDIA_TYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+
+
+def available_encodings():
+    """Encodings this server can produce, in order of preference."""
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def negotiate(accept_encoding):
+    """
+    Pick a content encoding from an Accept-Encoding header, or None for identity.
+    Ties in q-value go to the server's preference (zstd, then gzip).
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        token, _, params = item.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compressor(encoding):
+    """A streaming compressor with zlib's compress()/flush() interface."""
+    if encoding == "gzip":
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+def iter_file(path, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_compressed(chunks, encoding):
+    """
+    Compress an iterable of str or bytes chunks on the fly.
+
+    This is a plain generator, so StreamingResponse runs each step in its
+    thread pool and the event loop never waits on compression.
+    """
+    stream = compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.flush()
+
+
+def compressed_path(path, encoding):
+    """Path of an up-to-date pre-compressed copy of a log file, or None."""
+    candidate = path + EXTENSIONS[encoding]
+    try:
+        if os.path.getmtime(candidate) >= os.path.getmtime(path):
+            return candidate
+    except OSError:
+        pass
+    return None
+
+
+def compress_file(path, encoding="gzip"):
+    """Write a compressed copy of a closed log file next to it."""
+    target = path + EXTENSIONS[encoding]
+    partial = target + ".part"
+    try:
+        with open(partial, 'wb') as file:
+            for data in iter_compressed(iter_file(path), encoding):
+                file.write(data)
+        os.replace(partial, target)
+    except OSError as e:
+        print(f"Error compressing {path}: {e}")
+        if os.path.exists(partial):
+            os.remove(partial)
+        return None
+    return target
+
+
+def compress_in_background(path):
+    """Compress a closed log file from a daemon thread, if COMPRESS_CLOSED_LOGS is set."""
+    if not COMPRESS_CLOSED_LOGS or not os.path.isfile(path):
+        return None
+    thread = threading.Thread(target=compress_file, args=(path, available_encodings()[0]), name=f"compress-{os.path.basename(path)}", daemon=True)
+    thread.start()
+    return thread
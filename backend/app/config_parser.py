@@ -1,15 +1,20 @@
 import yaml
-import numpy as np
 import random
 from datetime import datetime
+from calibration import CalibrationTable
+from command_table import build_command_table
 
 CONFIG_FILE = 'configs/hotfire_config.yml'
+CHANNELS_PER_HAT = 8  # MCCDAQ hats expose 8 channels each
 config_data = None
+sensor_table = []  # flat (hatID, channelID) -> sensor lookup, rebuilt on every load
+calibration_table = None  # CalibrationTable over sensor_table slots, rebuilt on every load
+command_table = {}  # (type, name, state) -> tuple of MQTT payload bytes, rebuilt on every load
 
 
 def load_config():
     """Load the YAML configuration file."""
-    global config_data
+    global config_data, sensor_table, calibration_table, command_table
     with open(CONFIG_FILE, 'r') as file:
         config = yaml.safe_load(file)
     
@@ -19,34 +24,60 @@ def load_config():
         print(f"Configuration error: {e}")
         return
     
-    sensor_map = {(sensor['channelID'] + 8*sensor['hatID']): sensor for sensor in config.get('MCCDAQ', [])}
+    sensor_map = {sensor_slot(sensor['hatID'], sensor['channelID']): sensor for sensor in config.get('MCCDAQ', [])}
     relay_map = {relay['channelID']: relay for relay in config.get('relayBoard', [])}
     servo_map = {servo['channelID']: servo for servo in config.get('PCA9685', [])}
     gpio_map = {gpio['pinID']: gpio for gpio in config.get('GPIOs', [])}
+    board_map = {board['boardID']: board for board in config.get('relayBoards') or []}
     
+    # Fit every sensor's calibration polynomial once, into one coefficient matrix
+    table = build_sensor_table(sensor_map)
+    try:
+        calibrations = CalibrationTable(table)
+    except ValueError as e:
+        print(f"Configuration error: {e}")
+        return
+    for slot, sensor in enumerate(table):
+        if sensor is not None:
+            sensor["coefficients"] = calibrations.coefficients_of(slot)
+
     config_data = {
         "sensors": sensor_map,
         "relays": relay_map,
         "servos": servo_map,
         "gpios": gpio_map,
+        "boards": board_map,
     }
-    # Add slope and intercept for each sensor
-    for sensor in config_data["sensors"].values():
-        calibration = sensor.get("calibration", [])
-        degree = sensor.get("degree", 1)
-        if calibration and len(calibration) > 0:
-            #voltages, readings = zip(*calibration)
-            calibration_points = np.array(calibration)
-            voltages, readings = calibration_points[:, 0], calibration_points[:, 1]
-            m, b = np.polyfit(voltages, readings, degree)
-            
-            sensor["slope"] = m
-            sensor["intercept"] = b
-        else:
-            sensor["slope"] = 1.0
-            sensor["intercept"] = 0.0
+    sensor_table = table
+    calibration_table = calibrations
+    command_table = build_command_table(config_data)
     #print("Loaded config:", config_data)
 
+def sensor_slot(hat_id, channel_id):
+    """Flat slot of a (hatID, channelID) pair in the sensor table."""
+    return channel_id + CHANNELS_PER_HAT*hat_id
+
+def build_sensor_table(sensor_map):
+    """Build a list indexed by sensor slot, with None for unconfigured channels."""
+    if not sensor_map:
+        return []
+    table = [None] * (max(sensor_map) + 1)
+    for slot, sensor in sensor_map.items():
+        table[slot] = sensor
+    return table
+
+def lookup_sensor(hat_id, channel_id):
+    """Return the configured sensor for a hat/channel pair, or None."""
+    if not isinstance(hat_id, int) or not isinstance(channel_id, int):
+        return None
+    if not 0 <= channel_id < CHANNELS_PER_HAT or hat_id < 0:
+        return None
+    table = get_sensor_table()
+    slot = sensor_slot(hat_id, channel_id)
+    if slot >= len(table):
+        return None
+    return table[slot]
+
 def validate_config(config):
     """Validate the configuration for missing keys."""
     if 'MCCDAQ' not in config:
@@ -77,6 +108,13 @@ def validate_config(config):
             raise ValueError("Missing 'name' in relay entry: {relay}")
         #if 'type' not in relay:
             #print(f"Warning: Missing 'type' in relay entry: {relay}")
+
+    for board in config.get('relayBoards') or []:
+        if 'boardID' not in board:
+            raise ValueError(f"Missing 'boardID' in relay board entry: {board}")
+        budget = board.get('powerBudget')
+        if budget is not None and (not isinstance(budget, int) or isinstance(budget, bool) or budget < 1):
+            raise ValueError(f"'powerBudget' must be a positive integer in relay board entry: {board}")
     
     for servo in config.get('PCA9685', []):
         if 'channelID' not in servo:
@@ -108,6 +146,26 @@ def get_config():
         load_config()
         return config_data
 
+def get_sensor_table():
+    if config_data is None:
+        load_config()
+    return sensor_table
+
+def get_calibration_table():
+    if config_data is None:
+        load_config()
+    return calibration_table
+
+def get_command_table():
+    if config_data is None:
+        load_config()
+    return command_table
+
+def get_power_budgets():
+    """Board index -> power budget, for the relay boards that set powerBudget."""
+    boards = get_config().get("boards", {})
+    return {board_id: board["powerBudget"] for board_id, board in boards.items() if "powerBudget" in board}
+
 def get_actuators_config():
     config = get_config()
     actuators = []
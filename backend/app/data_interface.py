@@ -1,238 +1,203 @@
 import numpy as np
+import os
 import random
+import time
 from datetime import datetime
 import config_parser
+from history import HistoryStore
+from log_writer import BufferedWriter
+import binary_log
+import compression
+from snapshot import SnapshotChannel
+from metrics import registry, PROCESSING_BUCKETS_MS
 
 DATA_FILE = None
 SAVE_DATA_FLAG = False
 CALIBRATION_FLAG = True
-DATA_STORE_SIZE = 300  # maximum number of samples to store in memory
-ROLLING_WINDOW_SIZE = 100  # number of samples to use for rolling average
-RATE_WINDOW_SIZE = 50  # number of samples to use for rate of change
+DATA_FORMAT = "csv"  # "csv" for text logs, "binary" for fixed-width float64 records (see binary_log)
+DATA_FORMATS = {"csv": "csv", "binary": "bin"}  # format -> file extension
+DATA_STORE_SIZE = 300  # ring buffer capacity: samples of history kept per sensor
+ROLLING_WINDOW_SIZE = 100  # number of latest samples to use for rolling statistics (<= DATA_STORE_SIZE)
+INDEX_EVERY = 1000  # rows between entries in a CSV data file's sidecar time index
+RATE_WINDOW_SIZE = 50  # number of latest samples to use for rate of change (<= DATA_STORE_SIZE)
 test_start = datetime.now()
 file_num = 0
 file_length = 0
 processed_data = {"sensors": []} #"gpios": []
-data_store = {}
+processed_snapshot = SnapshotChannel(processed_data)  # versioned, read-only view of processed_data
+data_store = HistoryStore(DATA_STORE_SIZE, stats_window=ROLLING_WINDOW_SIZE)
+data_writer = None  # BufferedWriter for DATA_FILE, opened on the first saved row
+data_columns = []  # sensor names in the open data file's column order
+sample_listeners = []  # called on the event loop with each message's {sensor name: calibrated value}
+process_time = registry.histogram("process_data_ms", "Time to calibrate and publish one telemetry message", PROCESSING_BUCKETS_MS)
+save_time = registry.histogram("save_data_ms", "Time to write one row to the data file", PROCESSING_BUCKETS_MS)
 
 def new_data_file():
     global file_num, DATA_FILE
+    close_data_file()
     date = datetime.now().strftime("%Y-%m-%d-%H")
-    DATA_FILE = f"{date}_data_{file_num}.csv"
-    # write the header to the file: Timestamp then each sensor name in the config
-    #with open(f"logs/{DATA_FILE}", 'w') as file:
-    #    file.write("Timestamp,")
-    #    for sensor in config_parser.get_config()["sensors"].values():
-    #        file.write(f"{sensor['name']},")
-    #    file.write("\n")
+    DATA_FILE = f"{date}_data_{file_num}.{DATA_FORMATS[DATA_FORMAT]}"
+    # The file itself is only opened once the backend saves a row (see save_data),
+    # since the Pi's logger may be writing to this name instead.
     file_num += 1
     return
 
-def save_data(data):
-    """Save sensor data to a CSV file."""
+def logger_file():
+    """
+    File name for the Pi's logger. It always writes CSV, so it gets a .csv
+    name even when DATA_FILE is a binary .bin file written by the backend.
+    """
+    return os.path.splitext(DATA_FILE)[0] + ".csv"
+
+def open_data_file():
+    """Open a buffered writer on DATA_FILE with a header of the configured sensor names."""
+    global data_writer, data_columns
+    sensors = list(config_parser.get_config()["sensors"].values())
+    data_columns = [sensor["name"] for sensor in sensors]
+    if DATA_FILE.endswith(".bin"):
+        # fixed-width records can already be binary searched, so no time index
+        header = binary_log.make_header(sensors)
+        data_writer = BufferedWriter(f"logs/{DATA_FILE}", header=header)
+    else:
+        header = "Timestamp," + "".join(f"{name}," for name in data_columns) + "\n"
+        data_writer = BufferedWriter(f"logs/{DATA_FILE}", header=header, index_every=INDEX_EVERY)
+
+def close_data_file():
+    """Flush and close the data file writer, if one is open."""
+    global data_writer
+    if data_writer is not None:
+        data_writer.close()
+        compression.compress_in_background(data_writer.path)
+        data_writer = None
+
+def stop_saving_data():
+    global SAVE_DATA_FLAG
+    SAVE_DATA_FLAG = False
+    close_data_file()
+
+def save_data(data, readings=None):
+    """
+    Save sensor data to the data file. `readings` maps sensor names to their
+    full-precision values for binary files; without it the display values in
+    `data` are used.
+    """
     if DATA_FILE is not None:
-        with open(f"logs/{DATA_FILE}", 'a') as file:
-            # write a global timestamp to the file
-            now = datetime.now()
-            timedelta = now-test_start
-            timestamp = str(timedelta)
-            file.write(f"{timestamp},")
-
-            for sensor in config_parser.get_config()["sensors"].values():
-                sensor_name = sensor["name"]
-                # find the sensor in the data
-                sensor_data = next((s for s in data if s["name"] == sensor_name), None)
-                if sensor_data:
-                    file.write(f"{sensor_data['value']},")
-                else:
-                    file.write("N/A,")
-            """"
-            for gpio in get_config()["gpios"].values():
-                gpio_name = gpio["name"]
-                # find the gpio in the data
-                gpio_data = next((g for g in data["gpios"] if g["name"] == gpio_name), None)
-                if gpio_data:
-                    file.write(f"{gpio_data['state']},")
-                else:
-                    file.write("N/A,")
-            for thermocouple in data.get("thermocouples", []):
-                thermocouple_name = thermocouple["name"]
-                # find the thermocouple in the config
-                thermocouple_info = next((t for t in get_config()["thermocouples"].values() if t["name"] == thermocouple_name), None)
-                if thermocouple_info:
-                    file.write(f"{thermocouple['value']},")
-                else:
-                    file.write("N/A,")
-            """
-            file.write("\n")
+        if data_writer is None or data_writer.path != f"logs/{DATA_FILE}":
+            close_data_file()
+            open_data_file()
+        # write a global timestamp to the file
+        elapsed = datetime.now() - test_start
+        values = {s["name"]: s["value"] for s in data}
+        if DATA_FILE.endswith(".bin"):
+            if readings is None:
+                readings = {name: float(value) for name, value in values.items()}
+            row = [readings.get(name, np.nan) for name in data_columns]
+            data_writer.write(binary_log.encode_record(elapsed.total_seconds(), row))
+        else:
+            row = "".join(f"{values.get(name, 'N/A')}," for name in data_columns)
+            data_writer.write(f"{elapsed},{row}\n", elapsed=elapsed.total_seconds())
     else:
         print("Error saving data: no data file")
         raise ValueError("Error saving data: no data file")
     
-def format_for_ws():
-    global data_store
-    ws_data = processed_data
-    for sensor in ws_data.get("sensors", []):
-        name = sensor["name"]
-
-        # ----- cast value -----
-        try:
-            value = float(sensor.get("value"))
-        except (TypeError, ValueError):
-            # skip this sensor if value is missing or bad
-            continue
-
-        # ----- cast timestamp -----
-        ts_raw = sensor.get("timestamp")
-        if ts_raw is None:
-            continue                      # or use datetime.now().timestamp()
-
-        # If your source is µs since epoch as an int/str
-        timestamp = float(ts_raw) #* MICROS_TO_SECONDS
-        # If it’s already seconds as float, just: timestamp = float(ts_raw)
-
-        # history buffer
-        if name not in data_store:
-            data_store[name] = []
-        
-        data_store[name].append((timestamp, value))
-        if len(data_store[name]) > DATA_STORE_SIZE:
-            data_store[name].pop(0)
-
-        # rolling stats
-        avg_value = get_rolling_average(name)
-        rate      = get_rolling_rate(name)
-
-        sensor["avg"]  = f"{round(avg_value, 2)}"
-        sensor["rate"] = rate
-
-    return ws_data
-
-def get_rolling_average(sensor_name):
-    """Calculate the rolling average for a given sensor."""
-    # calculate the average of the last ROLLING_WINDOW_SIZE values
-    if sensor_name not in data_store:
-        return float("nan")
-    if len(data_store[sensor_name]) == 0:
+def format_stats(sensor_name):
+    """Rolling statistics for a sensor, formatted for the processed frame."""
+    stats = data_store.stats(sensor_name)
+    if stats is None:
+        return {"avg": "nan", "stddev": "nan", "min": "nan", "max": "nan", "rate": "N/A"}
+    return {
+        "avg": f"{round(stats.mean, 2)}",
+        "stddev": f"{round(stats.stddev, 2)}",
+        "min": f"{round(stats.min, 2)}",
+        "max": f"{round(stats.max, 2)}",
+        "rate": get_rolling_rate(sensor_name),
+    }
+
+
+def get_rolling_rate_value(sensor_name):
+    """Rate of change over the latest RATE_WINDOW_SIZE samples, or NaN if it cannot be computed."""
+    hist = data_store.get(sensor_name)
+    if hist is None or len(hist) < 2:
         return float("nan")
-    if len(data_store[sensor_name]) < ROLLING_WINDOW_SIZE:
-        # If not enough data, return the average of all available values
-        values = [float(v) for _, v in data_store[sensor_name]]
-        return np.mean(values) if values else float("nan")
-    if len(data_store[sensor_name]) > ROLLING_WINDOW_SIZE:
-        # If more than ROLLING_WINDOW_SIZE, use only the last ROLLING_WINDOW_SIZE values
-        values = [float(v) for _, v in data_store[sensor_name][-ROLLING_WINDOW_SIZE:]]
-    else:
-        # If exactly ROLLING_WINDOW_SIZE, use all values
-        values = [float(v) for _, v in data_store[sensor_name]]
-    return np.mean(values) if values else float("nan")
 
-
-def get_rolling_rate(sensor_name):
-    hist = data_store[sensor_name]
-    n    = len(hist)
-
-    if n >= RATE_WINDOW_SIZE:
-        t0, v0 = hist[0]
-        t1, v1 = hist[RATE_WINDOW_SIZE - 1]
-    elif n >= 2:
-        t0, v0 = hist[0]
-        t1, v1 = hist[-1]
-    else:
-        return "N/A"
+    # first and last of the latest RATE_WINDOW_SIZE samples
+    times, values = hist.window(RATE_WINDOW_SIZE)
+    t0, v0 = times[0], values[0]
+    t1, v1 = times[-1], values[-1]
 
     dt = t1 - t0
-    if dt <= 0:
-        return "N/A"
+    if not dt > 0:  # also rejects missing (NaN) timestamps
+        return float("nan")
 
     rate = (v1 - v0) / dt
     if dt < 1.0:               # “Δ per second” normalisation
         rate *= (1.0 / dt)
+    return rate
 
+def get_rolling_rate(sensor_name):
+    rate = get_rolling_rate_value(sensor_name)
+    if rate != rate:
+        return "N/A"
     return f"{round(rate, 2)}"  # round to 2 decimal places
 
-def interpolate(value, calibration_points, degree=1):
-    """Perform linear interpolation for sensor calibration."""
-    calibration_points = np.array(calibration_points)
-    voltages, readings = calibration_points[:, 0], calibration_points[:, 1]
-    m, b = np.polyfit(voltages, readings, degree)
-    return m*value + b
+def calibrate(slots, values):
+    """Calibrate a batch of readings from sensor slots in one vectorized pass."""
+    return config_parser.get_calibration_table().apply(slots, values)
+
+def _reading(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
 
 async def process_data(raw_data):
     """Process incoming raw sensor and actuator data."""
     global processed_data, data_store
+    start = time.perf_counter_ns()
     sensor_data = []
+    readings = {}  # sensor name -> calibrated value, before rounding for display
     # Process sensors
     if "sensors" in raw_data:
+        # Find each sensor in the config using hat_id and channel_id
+        matched, slots, values = [], [], []
         for sensor in raw_data.get("sensors", []):
             hat_id = sensor.get("hat_id")
             channel_id = sensor.get("channel_id")
-            value = sensor.get("value")
-            timestamp = sensor.get("timestamp")
-
-            # Find the sensor in the config using hat_id and channel_id
-            sensor_info = next(
-                (s for s in config_parser.get_config()["sensors"].values() if s["hatID"] == hat_id and s["channelID"] == channel_id),
-                None
-            )
+            sensor_info = config_parser.lookup_sensor(hat_id, channel_id)
             if sensor_info:
-                name = sensor_info["name"]
-                calibration = sensor_info.get("calibration", [])
-
-                # generate fake data for testing
-                # value = round(random.uniform(-5.0, 10.0), 3)
-                
-                # Apply interpolation only if calibration is non-empty
-                if calibration and len(calibration) > 0 and CALIBRATION_FLAG:
-                    value = sensor_info["slope"] * value + sensor_info["intercept"]
-                
-                # Initialize history for this sensor
-                if name not in data_store:
-                    data_store[name] = []
-
-                # Append new value with timestamp
-                data_store[name].append((timestamp, value))
-                if len(data_store[name]) > ROLLING_WINDOW_SIZE:
-                    data_store[name].pop(0)
-
-                # Compute rolling average
-                rolling_values = [v for t, v in data_store[name]]
-                avg_value = np.mean(rolling_values)
-
-                # Compute rate of change
-                if len(data_store[name]) >= RATE_WINDOW_SIZE:
-                    t0, v0 = data_store[name][0]
-                    t1, v1 = data_store[name][RATE_WINDOW_SIZE - 1]
-                    # Convert timestamps to datetime if needed
-                    #if isinstance(t0, str):
-                    #    t0 = datetime.fromisoformat(t0)
-                    #if isinstance(t1, str):
-                    #    t1 = datetime.fromisoformat(t1)
-                elif len(data_store[name]) >= 2:
-                    t0, v0 = data_store[name][0]
-                    t1, v1 = data_store[name][-1]
-                else:
-                    t1, t0, v1, v0 = 0, 0, 0, 0
-
-                # Now compute the rate
-                if t1 != t0:
-                    dt = t1 - t0  # time difference in seconds
-                    rate = (v1 - v0) / dt
-                    # If the time span is less than 1 second, normalize to per second
-                    if dt < 1.0:
-                        rate *= (1.0 / dt)
-                    rate_str = f"{round(rate, 2)}"
-                else:
-                    rate_str = "N/A"
-
-                sensor_data.append({
-                    "name": sensor_info["name"],
-                    "value": f"{round(value, 2)}",
-                    "avg": f"{round(avg_value, 2)}",
-                    "rate": rate_str,
-                    "unit": sensor_info.get("unit", ""),
-                    "timestamp": timestamp,
-                })
-    processed_data["sensors"] = sensor_data
+                matched.append((sensor_info, sensor.get("timestamp")))
+                slots.append(config_parser.sensor_slot(hat_id, channel_id))
+                values.append(_reading(sensor.get("value")))
+
+        # Calibrate the whole batch at once; uncalibrated sensors pass through
+        values = np.array(values, dtype=np.float64)
+        if CALIBRATION_FLAG and matched:
+            values = calibrate(slots, values)
+
+        for (sensor_info, timestamp), value in zip(matched, values.tolist()):
+            name = sensor_info["name"]
+            # Append new value with timestamp to this sensor's history,
+            # which also updates its rolling statistics
+            data_store.append(name, timestamp, value)
+            readings[name] = value
+
+            sensor_data.append({
+                "name": name,
+                "value": f"{round(value, 2)}",
+                **format_stats(name),
+                "unit": sensor_info.get("unit", ""),
+                "timestamp": timestamp,
+            })
+    # publish a new frame rather than mutating the one readers may be holding
+    processed_data = {"sensors": sensor_data}
+    processed_snapshot.publish(processed_data)
+    for listener in sample_listeners:
+        try:
+            listener(readings)
+        except Exception as e:
+            print(f"Error in sample listener: {e}")
+    saving = time.perf_counter_ns()
+    process_time.observe_ns(saving - start)
     if SAVE_DATA_FLAG:
-        save_data(processed_data["sensors"])  # Save the processed data to a file
\ No newline at end of file
+        save_data(processed_data["sensors"], readings)  # Save the processed data to a file
+        save_time.observe_ns(time.perf_counter_ns() - saving)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import math
+import config_parser
+from broadcast import BroadcastHub
+from snapshot import encode_json
+
+DEFAULT_DEADBAND = 0.0  # sensors without a `deadband` in the config are sent on any change
+KEYFRAME_INTERVAL = 50  # ticks between forced full frames (5 s at the 0.1 s cadence)
+
+
+def _changed(new, old, deadband):
+    """Whether a sensor value moved further than its dead-band from the last sent value."""
+    try:
+        new, old = float(new), float(old)
+    except (TypeError, ValueError):
+        return new != old
+    if math.isnan(new) or math.isnan(old):
+        return math.isnan(new) != math.isnan(old)
+    return abs(new - old) > deadband
+
+
+class DeltaFrame:
+    """
+    One tick of the delta stream: the rows sent to up-to-date clients, plus
+    the full sensor state those clients hold afterwards, sent as a keyframe
+    to clients that are new or have missed frames.
+    """
+
+    __slots__ = ("seq", "type", "rows", "state", "_text", "_keyframe_text")
+
+    def __init__(self, seq, type, rows, state):
+        self.seq = seq
+        self.type = type  # "delta" or "keyframe"
+        self.rows = rows
+        self.state = state
+        self._text = None
+        self._keyframe_text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = encode_json({"type": self.type, "seq": self.seq, "sensors": self.rows}).decode('utf-8')
+        return self._text
+
+    @property
+    def keyframe_text(self):
+        if self.type == "keyframe":
+            return self.text
+        if self._keyframe_text is None:
+            self._keyframe_text = encode_json({"type": "keyframe", "seq": self.seq, "sensors": self.state}).decode('utf-8')
+        return self._keyframe_text
+
+
+class DeltaHub(BroadcastHub):
+    """
+    Broadcast hub that only sends the sensors whose value moved further than
+    their configured `deadband` since they were last sent.
+
+    Every `keyframe_interval` ticks all sensors are sent. A client gets a
+    keyframe of the current state when it connects and whenever it has
+    dropped frames, so deltas always apply to what it already holds.
+    The producer must return a processed-data Snapshot.
+    """
+
+    def __init__(self, name, producer, interval=0.1, keyframe_interval=KEYFRAME_INTERVAL):
+        super().__init__(name, producer, interval)
+        self.keyframe_interval = keyframe_interval
+        self._sent = {}  # sensor name -> row as last sent
+        self._seq = 0
+        self._ticks = 0  # ticks since the last keyframe
+        self._last_snapshot = None
+        self._latest = None  # last published DeltaFrame
+        self._deadbands = {}
+        self._deadband_config = None
+
+    def _get_deadbands(self):
+        config = config_parser.get_config()
+        if config is not self._deadband_config:
+            self._deadbands = {
+                sensor["name"]: sensor.get("deadband", DEFAULT_DEADBAND) for sensor in config["sensors"].values()
+            }
+            self._deadband_config = config
+        return self._deadbands
+
+    def encode(self, snapshot):
+        rows = snapshot.data.get("sensors", [])
+        self._ticks += 1
+        if self._seq == 0 or self._ticks >= self.keyframe_interval:
+            self._ticks = 0
+            self._sent = {row["name"]: row for row in rows}
+            frame_type, changed = "keyframe", rows
+        else:
+            if snapshot is self._last_snapshot:
+                return None
+            deadbands = self._get_deadbands()
+            changed = []
+            for row in rows:
+                name = row["name"]
+                last = self._sent.get(name)
+                if last is None or _changed(row.get("value"), last.get("value"), deadbands.get(name, DEFAULT_DEADBAND)):
+                    self._sent[name] = row
+                    changed.append(row)
+            frame_type = "delta"
+        self._last_snapshot = snapshot
+        if not changed and frame_type == "delta":
+            return None
+        self._seq += 1
+        self._latest = DeltaFrame(self._seq, frame_type, changed, list(self._sent.values()))
+        return self._latest
+
+    async def send_frames(self, websocket, queue):
+        last_seq = None
+        # start every client from a keyframe of the current state
+        latest = self._latest
+        if latest is not None:
+            await self.send(websocket, latest.keyframe_text)
+            last_seq = latest.seq
+        while True:
+            frame = await queue.get()
+            if last_seq is not None and frame.seq <= last_seq:
+                continue
+            if last_seq is not None and frame.seq == last_seq + 1:
+                await self.send(websocket, frame.text)
+            else:
+                await self.send(websocket, frame.keyframe_text)
+            last_seq = frame.seq
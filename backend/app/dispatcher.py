@@ -0,0 +1,225 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+COMMAND_QOS = 1  # 0: fire and forget, 1: broker acknowledges every command
+MAX_IN_FLIGHT = 8  # commands published but not yet acknowledged
+DISPATCH_QUEUE_SIZE = 256  # commands waiting for a slot in the in-flight window
+ACK_TIMEOUT = 5.0  # seconds before an unacknowledged command gives up its slot
+TIMING_HISTORY = 200  # completed commands kept for timing reports
+
+_ids = itertools.count(1)
+
+
+class CommandTicket:
+    """
+    One command going through the dispatcher, with its enqueue, publish and
+    acknowledgement times (time.monotonic()). For QoS 0 the acknowledgement
+    is paho writing the packet to the socket; for QoS 1 and 2 it is the
+    broker's reply.
+    """
+
+    def __init__(self, payload, qos, future):
+        self.id = next(_ids)
+        self.payload = payload
+        self.qos = qos
+        self.mid = None
+        self.enqueued = time.monotonic()
+        self.published = None
+        self.acked = None
+        self.error = None
+        self._future = future
+
+    @property
+    def done(self):
+        return self._future.done()
+
+    async def wait(self, timeout=None):
+        """Wait for the acknowledgement. Raises the dispatch error, if any."""
+        await asyncio.wait_for(asyncio.shield(self._future), timeout)
+        return self
+
+    def timings(self):
+        def ms(start, end):
+            return None if start is None or end is None else round((end - start) * 1000, 2)
+        return {
+            "id": self.id,
+            "qos": self.qos,
+            "queued_ms": ms(self.enqueued, self.published),
+            "ack_ms": ms(self.published, self.acked),
+            "total_ms": ms(self.enqueued, self.acked),
+            "error": self.error,
+        }
+
+
+class CommandDispatcher:
+    """
+    Publishes commands from a bounded queue on one task of the application's
+    event loop, keeping at most `window` commands in flight.
+
+    The transport's publish() only queues the packet for its network thread
+    (paho's, or the loopback broker's), so the dispatcher never blocks the
+    loop. Acknowledgements arrive on that thread through on_publish and are
+    handed back to the loop. A command published while the broker is
+    unreachable fails at once. One not acknowledged within ACK_TIMEOUT is
+    withdrawn from the transport, so it is never sent after being reported
+    as timed out, and frees its slot.
+    """
+
+    def __init__(self, client, topic, qos=COMMAND_QOS, window=MAX_IN_FLIGHT, maxsize=DISPATCH_QUEUE_SIZE):
+        self.client = client
+        self.topic = topic
+        self.qos = qos
+        self.window = window
+        self.maxsize = maxsize
+        self._loop = None
+        self._queue = None
+        self._slots = None
+        self._task = None
+        self._in_flight = {}  # paho mid -> ticket
+        self.history = deque(maxlen=TIMING_HISTORY)
+        self.submitted = 0
+        self.acked = 0
+        self.failed = 0
+        self.timed_out = 0
+        client.on_publish = self._on_publish
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def in_flight(self):
+        """Commands published but not yet acknowledged."""
+        return len(self._in_flight)
+
+    def start(self):
+        """Start the dispatch task. Must be called from the application's event loop."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.maxsize)
+        self._slots = asyncio.Semaphore(self.window)
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for ticket in list(self._in_flight.values()):
+            self._finish(ticket, RuntimeError("dispatcher stopped"))
+        self._loop = None
+
+    def _ticket(self, payload):
+        if not self.running:
+            raise RuntimeError("Command dispatcher is not running")
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        return CommandTicket(payload, self.qos, self._loop.create_future())
+
+    async def submit(self, payload):
+        """Queue a payload (bytes or str), waiting for room in the queue. Returns its ticket."""
+        ticket = self._ticket(payload)
+        await self._queue.put(ticket)
+        self.submitted += 1
+        return ticket
+
+    def submit_nowait(self, payload):
+        """Queue a payload, raising asyncio.QueueFull if the queue is full."""
+        ticket = self._ticket(payload)
+        self._queue.put_nowait(ticket)
+        self.submitted += 1
+        return ticket
+
+    async def send(self, payload):
+        """
+        Queue a payload and wait for its acknowledgement. A command that is
+        not acknowledged raises TimeoutError once it has been withdrawn.
+        """
+        ticket = await self.submit(payload)
+        return await ticket.wait()
+
+    async def _run(self):
+        while True:
+            ticket = await self._queue.get()
+            await self._slots.acquire()
+            try:
+                info = self.client.publish(self.topic, ticket.payload, qos=ticket.qos)
+            except Exception as e:
+                self._slots.release()
+                self.failed += 1
+                self._finish(ticket, RuntimeError(f"publish failed: {e}"))
+                continue
+            ticket.published = time.monotonic()
+            # not queued for a later connection: a command is sent now or not at all
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                self._slots.release()
+                self.failed += 1
+                self._finish(ticket, RuntimeError(f"publish failed: {mqtt.error_string(info.rc)}"))
+                continue
+            # registered before control returns to the loop, so before _on_ack can run
+            ticket.mid = info.mid
+            self._in_flight[info.mid] = ticket
+            self._loop.call_later(ACK_TIMEOUT, self._expire, ticket)
+
+    def _on_publish(self, client, userdata, mid, *args):
+        # transport network thread
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._on_ack, mid)
+            except RuntimeError:  # loop closed
+                pass
+
+    def _on_ack(self, mid):
+        ticket = self._in_flight.pop(mid, None)
+        if ticket is None:
+            return  # published outside the dispatcher, or already timed out
+        ticket.acked = time.monotonic()
+        self._slots.release()
+        self.acked += 1
+        self._finish(ticket)
+
+    def _expire(self, ticket):
+        if self._in_flight.get(ticket.mid) is not ticket:
+            return
+        del self._in_flight[ticket.mid]
+        self.client.discard(ticket.mid)
+        self._slots.release()
+        self.timed_out += 1
+        self._finish(ticket, TimeoutError(f"not acknowledged within {ACK_TIMEOUT} s"))
+
+    def _finish(self, ticket, error=None):
+        if ticket.done:
+            return
+        if error is not None:
+            ticket.error = str(error)
+            ticket._future.set_exception(error)
+            ticket._future.exception()  # fire-and-forget callers never await it; don't warn
+        else:
+            ticket._future.set_result(ticket)
+        self.history.append(ticket)
+
+    def stats(self):
+        completed = [ticket.timings() for ticket in self.history if ticket.acked is not None]
+        totals = sorted(timing["total_ms"] for timing in completed)
+        return {
+            "qos": self.qos,
+            "window": self.window,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "acked": self.acked,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "median_total_ms": totals[len(totals) // 2] if totals else None,
+            "max_total_ms": totals[-1] if totals else None,
+            "recent": [ticket.timings() for ticket in list(self.history)[-20:]],
+        }
@@ -0,0 +1,62 @@
+import math
+import numpy as np
+
+
+def minmax(x, y, n_out):
+    """
+    Keep the minimum and maximum of each of n_out/2 equal-count buckets, in time order.
+    Preserves spikes exactly, which matters for pressure and load transients.
+    """
+    n = len(x)
+    buckets = max(1, n_out // 2)
+    if n <= n_out or n < 2 * buckets:
+        return x, y
+    size = math.ceil(n / buckets)
+    pad = size * buckets - n
+    # pad with copies of the last point so every bucket has the same length
+    padded = np.concatenate([y, np.repeat(y[-1:], pad)]).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lo = offsets + padded.argmin(axis=1)
+    hi = offsets + padded.argmax(axis=1)
+    keep = np.unique(np.minimum(np.concatenate([lo, hi]), n - 1))
+    return x[keep], y[keep]
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: keep the first and last points, and from
+    each bucket in between the point forming the largest triangle with the
+    point kept before it and the average of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = end, (edges[i + 2] if i + 2 < len(edges) else n)
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
+
+
+def downsample(x, y, n_out, method="lttb"):
+    """Drop non-finite samples, then reduce the series to at most n_out points."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'")
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.all():
+        x, y = x[finite], y[finite]
+    return METHODS[method](x, y, n_out)
@@ -31,16 +31,10 @@ def generate_data():
         timestamp = sensor.get("timestamp")
 
         # Find the sensor in the config using hat_id and channel_id
-        sensor_info = next(
-            (s for s in config_parser.get_config()["sensors"].values() if s["hatID"] == hat_id and s["channelID"] == channel_id),
-            None
-        )
+        sensor_info = config_parser.lookup_sensor(hat_id, channel_id)
         if sensor_info:
-            calibration = sensor_info.get("calibration", [])
-
-            # Apply interpolation only if calibration is non-empty
-            if calibration and len(calibration) > 0:
-                value = data_interface.interpolate(value, calibration)
+            # Uncalibrated sensors pass through unchanged
+            value = config_parser.get_calibration_table().evaluate(config_parser.sensor_slot(hat_id, channel_id), value)
             
             processed_data["sensors"].append({
                 "name": sensor_info["name"],
@@ -48,7 +42,7 @@ def generate_data():
                 "timestamp": timestamp
             })
     if data_interface.SAVE_DATA_FLAG:
-        data_interface.save_data(processed_data)  # Save the processed data to a file
+        data_interface.save_data(processed_data["sensors"])  # Save the processed data to a file
     fake_processed_data = processed_data
     return processed_data
     """
@@ -0,0 +1,130 @@
+import numpy as np
+from rolling_stats import RollingStats
+
+
+class RingBuffer:
+    """
+    Fixed-capacity (timestamp, value) history for one sensor.
+
+    Each sample is written twice, `capacity` slots apart, so the most recent
+    n samples are always one contiguous slice and window() never copies.
+    Once full, every append overwrites the oldest sample.
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be at least 1")
+        self.capacity = capacity
+        self._times = np.full(2 * capacity, np.nan)
+        self._values = np.full(2 * capacity, np.nan)
+        self._head = 0  # next write position, always < capacity
+        self.count = 0  # samples currently held
+        self.total = 0  # samples appended since creation/clear
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        head = self._head
+        mirror = head + self.capacity
+        timestamp = np.nan if timestamp is None else timestamp
+        self._times[head] = self._times[mirror] = timestamp
+        self._values[head] = self._values[mirror] = value
+        self._head = head + 1 if head + 1 < self.capacity else 0
+        if self.count < self.capacity:
+            self.count += 1
+        self.total += 1
+
+    def _bounds(self, n):
+        n = self.count if n is None else max(0, min(n, self.count))
+        end = self._head + self.capacity
+        return end - n, end
+
+    def window(self, n=None):
+        """
+        Return (timestamps, values) views of the latest n samples, oldest first.
+        The views alias the buffer, so copy them if they must outlive later appends.
+        """
+        start, end = self._bounds(n)
+        return self._times[start:end], self._values[start:end]
+
+    def values(self, n=None):
+        start, end = self._bounds(n)
+        return self._values[start:end]
+
+    def times(self, n=None):
+        start, end = self._bounds(n)
+        return self._times[start:end]
+
+    def latest(self):
+        """Return the newest (timestamp, value) pair, or None if empty."""
+        if self.count == 0:
+            return None
+        index = self._head + self.capacity - 1
+        return self._times[index], self._values[index]
+
+    def clear(self):
+        self._times.fill(np.nan)
+        self._values.fill(np.nan)
+        self._head = 0
+        self.count = 0
+        self.total = 0
+
+
+class HistoryStore:
+    """
+    Per-sensor ring buffers keyed by sensor name.
+
+    Buffers are created on a sensor's first sample and all share the same
+    capacity; older samples are overwritten rather than trimmed. When
+    `stats_window` is set, each sensor also gets a RollingStats over its
+    latest `stats_window` samples, updated on every append.
+    """
+
+    def __init__(self, capacity, stats_window=None):
+        if stats_window is not None and not 1 <= stats_window <= capacity:
+            raise ValueError("Statistics window must fit inside the history capacity")
+        self.capacity = capacity
+        self.stats_window = stats_window
+        self._buffers = {}
+        self._stats = {}
+
+    def __contains__(self, name):
+        return name in self._buffers
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def get(self, name):
+        return self._buffers.get(name)
+
+    def names(self):
+        return list(self._buffers)
+
+    def stats(self, name):
+        return self._stats.get(name)
+
+    def append(self, name, timestamp, value):
+        """Append a sample to the sensor's buffer and return the buffer."""
+        buffer = self._buffers.get(name)
+        if buffer is None:
+            buffer = self._buffers[name] = RingBuffer(self.capacity)
+            if self.stats_window is not None:
+                self._stats[name] = RollingStats(self.stats_window)
+        if self.stats_window is not None:
+            window = self.stats_window
+            # the sample about to fall out of the statistics window, if any
+            evicted = buffer.values(window)[0] if buffer.count >= window else None
+            stats = self._stats[name]
+            stats.push(value, evicted)
+            buffer.append(timestamp, value)
+            # resync once per window so rounding error in the running updates cannot build up
+            if stats.pushes % window == 0:
+                stats.recompute(buffer.values(window))
+            return buffer
+        buffer.append(timestamp, value)
+        return buffer
+
+    def clear(self):
+        self._buffers.clear()
+        self._stats.clear()
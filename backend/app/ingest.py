@@ -0,0 +1,95 @@
+import asyncio
+
+INGEST_QUEUE_SIZE = 256  # decoded payloads waiting for the consumer task
+
+
+class IngestBridge:
+    """
+    Hands decoded telemetry from the MQTT network thread to one long-lived
+    consumer task on the application's event loop.
+
+    submit() never blocks the caller. The queue is bounded; when it is full
+    the oldest waiting payload is dropped, since only fresh telemetry is
+    worth processing. Payloads that arrive before start() (or after stop())
+    are dropped and counted separately.
+    """
+
+    def __init__(self, handler, maxsize=INGEST_QUEUE_SIZE):
+        self.handler = handler  # async callable taking one decoded payload
+        self.maxsize = maxsize
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self.received = 0
+        self.processed = 0
+        self.dropped_overflow = 0
+        self.dropped_not_running = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the consumer task. Must be called from the application's event loop."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.maxsize)
+        self._task = self._loop.create_task(self._consume())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self._loop = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def submit(self, payload):
+        """Queue a payload from any thread. Returns False if it was dropped."""
+        self.received += 1
+        loop = self._loop
+        if loop is None:
+            self.dropped_not_running += 1
+            return False
+        try:
+            loop.call_soon_threadsafe(self._enqueue, payload)
+        except RuntimeError:  # loop closed underneath us
+            self.dropped_not_running += 1
+            return False
+        return True
+
+    def _enqueue(self, payload):
+        queue = self._queue
+        if queue.full():
+            queue.get_nowait()
+            self.dropped_overflow += 1
+        queue.put_nowait(payload)
+        self.max_depth = max(self.max_depth, queue.qsize())
+
+    async def _consume(self):
+        while True:
+            payload = await self._queue.get()
+            try:
+                await self.handler(payload)
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Error processing telemetry: {e}")
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.maxsize,
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped_overflow": self.dropped_overflow,
+            "dropped_not_running": self.dropped_not_running,
+            "errors": self.errors,
+        }
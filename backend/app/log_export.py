@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import tarfile
+import time
+from email.utils import formatdate, parsedate_to_datetime
+import config_parser
+from log_reader import LOGS_DIR, resolve_log_file
+
+CHUNK_SIZE = 64 * 1024  # bytes read per chunk when streaming a file
+SESSION_SUFFIX = "_session.json"
+CONFIG_SUFFIX = "_config.yml"
+
+
+def file_validators(path):
+    """(ETag, Last-Modified) for a file, derived from its size and modification time."""
+    stat = os.stat(path)
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    return etag, formatdate(stat.st_mtime, usegmt=True)
+
+
+def parse_range(header, size):
+    """
+    The (first, last) byte positions requested by a single-range Range header,
+    or None if the header should be ignored and the whole file served.
+    Raises ValueError if the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    ranges = header[len("bytes="):].split(",")
+    if len(ranges) != 1:
+        return None  # multipart/byteranges is not supported, send the whole file
+    first, sep, last = ranges[0].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:  # suffix range: the last N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise ValueError
+            return max(0, size - length), size - 1
+        first = int(first)
+        last = int(last) if last else size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range '{header}'")
+    if first >= size or last < first:
+        raise ValueError(f"Range '{header}' not satisfiable for {size} bytes")
+    return first, min(last, size - 1)
+
+
+def if_range_matches(if_range, etag, last_modified):
+    """Whether an If-Range header still matches the file, so the range may be served."""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag  # weak tags never match for ranges
+    try:
+        return parsedate_to_datetime(if_range) == parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+
+def iter_range(path, first, last, chunk_size=CHUNK_SIZE):
+    """Yield bytes first..last (inclusive) of a file."""
+    remaining = last - first + 1
+    with open(path, 'rb') as file:
+        file.seek(first)
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def list_logs():
+    """Files in the logs directory, newest first."""
+    entries = []
+    for name in os.listdir(LOGS_DIR):
+        path = os.path.join(LOGS_DIR, name)
+        if os.path.isfile(path) and not name.startswith("."):
+            stat = os.stat(path)
+            entries.append({"name": name, "size": stat.st_size, "modified": stat.st_mtime})
+    entries.sort(key=lambda entry: entry["modified"], reverse=True)
+    return entries
+
+
+def session_stem(data_file):
+    return os.path.splitext(data_file)[0]
+
+
+def write_session_manifest(data_file, log_file):
+    """
+    Record which files belong to a test session, next to its data file:
+    the data file, the command log and a snapshot of the config in use.
+    """
+    stem = session_stem(data_file)
+    config_file = stem + CONFIG_SUFFIX
+    shutil.copyfile(config_parser.CONFIG_FILE, os.path.join(LOGS_DIR, config_file))
+    manifest = {
+        "data_file": data_file,
+        "log_file": log_file,
+        "config_file": config_file,
+        "started": time.time(),
+    }
+    with open(os.path.join(LOGS_DIR, stem + SESSION_SUFFIX), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def session_files(data_file):
+    """Names of the files in the logs directory that make up a data file's session."""
+    resolve_log_file(data_file)
+    names = [data_file]
+    manifest_name = session_stem(data_file) + SESSION_SUFFIX
+    manifest_path = os.path.join(LOGS_DIR, manifest_name)
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+        names += [manifest.get("log_file"), manifest.get("config_file"), manifest_name]
+    names.append(data_file + ".idx")  # sidecar time index, see time_index
+    return [name for name in names if name and os.path.isfile(os.path.join(LOGS_DIR, name))]
+
+
+def iter_tar(names, chunk_size=CHUNK_SIZE):
+    """
+    Stream an uncompressed tar archive of files in the logs directory.
+
+    Each member's size is fixed when its header is written, so a file that
+    is still being recorded is cut off at that point rather than corrupting
+    the archive. Nothing is staged on disk.
+    """
+    for name in names:
+        path = os.path.join(LOGS_DIR, name)
+        stat = os.stat(path)
+        info = tarfile.TarInfo(name)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = 0o644
+        yield info.tobuf(tarfile.PAX_FORMAT)
+        sent = 0
+        for chunk in iter_range(path, 0, info.size - 1, chunk_size):
+            sent += len(chunk)
+            yield chunk
+        if sent < info.size:  # the file shrank; keep the archive well formed
+            yield b"\0" * (info.size - sent)
+        if info.size % tarfile.BLOCKSIZE:
+            yield b"\0" * (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE)
+    yield b"\0" * (2 * tarfile.BLOCKSIZE)
@@ -0,0 +1,127 @@
+import os
+import numpy as np
+import binary_log
+import time_index
+from downsample import downsample, METHODS
+
+LOGS_DIR = "logs"
+CSV_CHUNK_ROWS = 5000  # rows parsed per chunk when streaming a CSV data file
+CHUNK_POINTS = 512  # points kept per column per chunk before the final downsampling pass
+
+
+def resolve_log_file(filename):
+    """Path of a file in the logs directory, rejecting anything outside it."""
+    if not filename or os.path.basename(filename) != filename or filename.startswith("."):
+        raise ValueError(f"Invalid log file name '{filename}'")
+    path = os.path.join(LOGS_DIR, filename)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Log file '{filename}' not found")
+    return path
+
+
+def parse_elapsed(text):
+    """Seconds from a CSV Timestamp cell: str(timedelta) ("[D day[s], ]H:MM:SS[.ffffff]") or plain seconds."""
+    text = text.strip()
+    days = 0
+    if "day" in text:
+        day_part, text = text.split(",", 1)
+        days = int(day_part.split()[0])
+        text = text.strip()
+    if ":" not in text:
+        return float(text) + days * 86400
+    hours, minutes, seconds = text.split(":")
+    return days * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _cell(text):
+    try:
+        return float(text)
+    except ValueError:  # "N/A" and other placeholders
+        return np.nan
+
+
+def read_csv_header(path):
+    with open(path, 'r') as file:
+        header = file.readline()
+    return [name.strip() for name in header.rstrip("\n").split(",") if name.strip()]
+
+
+def iter_csv_chunks(path, columns, start=None, end=None, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Stream a CSV data file, yielding (times, values) arrays for the rows in
+    [start, end], where values has one column per requested name. Reading
+    starts from the sidecar time index entry just before `start` when the
+    file has one, and stops at the first row after `end`, since rows are
+    written in time order.
+    """
+    names = read_csv_header(path)
+    missing = [name for name in columns if name not in names]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in {os.path.basename(path)}")
+    indices = [names.index(name) for name in columns]
+    times, rows = [], []
+    with open(path, 'rb') as file:
+        file.readline()  # header
+        offset = time_index.seek_offset(path, start) if start is not None else None
+        if offset is not None and offset > file.tell():
+            file.seek(offset)
+        for line in file:
+            cells = line.decode('utf-8', errors='replace').split(",")
+            try:
+                t = parse_elapsed(cells[0])
+            except ValueError:
+                continue  # partial or malformed row
+            if start is not None and t < start:
+                continue
+            if end is not None and t > end:
+                break
+            times.append(t)
+            rows.append([_cell(cells[i]) if i < len(cells) else np.nan for i in indices])
+            if len(times) >= chunk_rows:
+                yield np.array(times), np.array(rows, dtype=np.float64).reshape(-1, len(columns))
+                times, rows = [], []
+    if times:
+        yield np.array(times), np.array(rows, dtype=np.float64).reshape(-1, len(columns))
+
+
+def iter_chunks(path, columns, start=None, end=None, chunk_rows=CSV_CHUNK_ROWS):
+    """Stream (times, values) chunks from a CSV or binary data file."""
+    if binary_log.is_binary_log(path):
+        reader = binary_log.BinaryLogReader(path)
+        first, last = reader.row_range(start, end)
+        indices = [reader.columns.index(name) if name in reader.columns else None for name in columns]
+        missing = [name for name, i in zip(columns, indices) if i is None]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in {os.path.basename(path)}")
+        for row in range(first, last, chunk_rows):
+            block = reader.records[row:min(row + chunk_rows, last)]
+            yield block[:, 0], block[:, indices]
+    else:
+        yield from iter_csv_chunks(path, columns, start, end, chunk_rows)
+
+
+def query_range(filename, columns, start=None, end=None, max_points=1000, method="lttb"):
+    """
+    Downsampled series for `columns` of a recorded data file, between `start`
+    and `end` seconds of its Timestamp column.
+
+    The file is streamed in chunks. Each chunk is reduced per column to its
+    min/max points, so memory stays bounded by the number of chunks rather
+    than the length of the recording; the final pass applies `method`.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'")
+    path = resolve_log_file(filename)
+    kept = {name: ([], []) for name in columns}
+    for times, values in iter_chunks(path, columns, start, end):
+        for i, name in enumerate(columns):
+            x, y = downsample(times, values[:, i], CHUNK_POINTS, "minmax")
+            kept[name][0].append(x)
+            kept[name][1].append(y)
+    series = {}
+    for name, (xs, ys) in kept.items():
+        x = np.concatenate(xs) if xs else np.empty(0)
+        y = np.concatenate(ys) if ys else np.empty(0)
+        x, y = downsample(x, y, max_points, method)
+        series[name] = (x, y)
+    return series
@@ -0,0 +1,97 @@
+import os
+import threading
+import time_index
+
+FLUSH_ROWS = 500  # flush as soon as this many rows are buffered
+FLUSH_INTERVAL = 1.0  # otherwise flush at least this often (seconds)
+
+
+class BufferedWriter:
+    """
+    Keeps a log file open and writes buffered rows from a background thread.
+
+    write() only appends to an in-memory buffer, so callers on the ingest path
+    never touch the disk. The flush thread writes the buffer out every
+    `flush_interval` seconds, or sooner once `flush_rows` rows are waiting.
+    close() performs a final flush and syncs the file to disk.
+
+    With `index_every` set, every Nth row written with a timestamp also gets
+    an (elapsed time, byte offset) entry in a sidecar index (see time_index).
+    Index entries are written after the rows they point to.
+    """
+
+    def __init__(self, path, header=None, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL, index_every=None):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        # append so reopening a log (e.g. after a stop/start) never truncates it
+        self._file = open(path, 'ab')
+        self._buffer = []
+        self.index_every = index_every
+        self._index_file = open(time_index.index_path(path), 'ab') if index_every else None
+        self._index_buffer = []
+        self._lock = threading.Lock()  # guards the buffers
+        self._io_lock = threading.Lock()  # keeps flushes in order
+        self._wake = threading.Event()
+        self._closed = False
+        self.rows = 0
+        self.offset = self._file.tell()  # logical file size, including buffered rows
+        if header and self.offset == 0:
+            self.write(header)
+            self.rows = 0
+        self._thread = threading.Thread(target=self._run, name=f"writer-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def write(self, data, elapsed=None):
+        """Buffer one row (str or bytes), optionally with its elapsed time for the index."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"Log file {self.path} is closed")
+            if self._index_file is not None and elapsed is not None and self.rows % self.index_every == 0:
+                self._index_buffer.append(time_index.encode_entry(elapsed, self.offset))
+            self._buffer.append(data)
+            self.offset += len(data)
+            self.rows += 1
+            pending = len(self._buffer)
+        if pending >= self.flush_rows:
+            self._wake.set()
+
+    def flush(self):
+        with self._io_lock:
+            with self._lock:
+                chunks, self._buffer = self._buffer, []
+                entries, self._index_buffer = self._index_buffer, []
+            if chunks:
+                self._file.write(b"".join(chunks))
+                self._file.flush()
+            if entries:
+                self._index_file.write(b"".join(entries))
+                self._index_file.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Error flushing {self.path}: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self._index_file is not None:
+            self._index_file.close()
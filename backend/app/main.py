@@ -7,21 +7,36 @@ import logging
 import threading
 import yaml
 import os
+import struct
+import numpy as np
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, JSONResponse, StreamingResponse, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Tuple, Optional
 import mqtt_interface as mqtt
 import config_parser
 import data_interface
 import command_interface
+import command_tracker
+import binary_log
+import log_reader
+import compression
+import log_export
 import plotting
+import metrics
+import profiler
 from html_generator import generate_html, new_html, calibration_html
-from auth import authenticate_user, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from broadcast import BroadcastHub
+from delta_stream import DeltaHub
+from binary_stream import BinaryHub
+import subscriptions
+from snapshot import etag_matches
+from auth import authenticate_user, create_access_token, get_current_user, require_user, ACCESS_TOKEN_EXPIRE_MINUTES
 import dummy_pi
 from dummy_pi import generate_data, handle_dummy_command, fake_processed_data
 
@@ -55,6 +70,22 @@ config_parser.load_config()  # Load the initial configuration
 # Initialize dummy data generation if enabled
 #if FAKE_DATA_FLAG:
 
+@app.on_event("startup")
+async def startup():
+    # Consume MQTT telemetry and publish commands on this event loop
+    mqtt.ingest_bridge.start()
+    mqtt.command_dispatcher.start()
+    mqtt.connect()
+
+@app.on_event("shutdown")
+async def shutdown():
+    mqtt.disconnect()
+    await mqtt.ingest_bridge.stop()
+    await mqtt.command_dispatcher.stop()
+    data_interface.close_data_file()
+    command_interface.close_log_file()
+    plotting.shutdown()
+
 # Function to get token from WebSocket query parameters
 async def get_token_from_websocket(websocket: WebSocket):
     try:
@@ -92,9 +123,63 @@ async def get_commandUI():
 async def basic_test_endpoint():
     return {"message": "Hello World from Backend!"}
 
+def snapshot_response(request: Request, snapshot, body=None):
+    """
+    Serve a snapshot's cached JSON, or 304 Not Modified if the client already has this version.
+    """
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(snapshot.body if body is None else body, media_type="application/json", headers=headers)
+
 @app.get("/raw_data")
-async def data_test_endpoint():
-    return {"data" : mqtt.raw_data}  
+async def data_test_endpoint(request: Request):
+    snapshot = mqtt.raw_snapshot.current
+    return snapshot_response(request, snapshot, body=b'{"data":' + snapshot.body + b'}')
+
+@app.get("/ingest_stats")
+async def ingest_stats_endpoint():
+    return mqtt.ingest_bridge.stats()
+
+@app.get("/command_stats")
+async def command_stats_endpoint():
+    return mqtt.command_dispatcher.stats()
+
+@app.get("/command_latency")
+async def command_latency_endpoint():
+    return command_tracker.tracker.report()
+
+@app.get("/metrics")
+async def metrics_endpoint(format: str = "prometheus"):
+    """Pipeline counters and latency histograms, in Prometheus text format or as JSON (?format=json)."""
+    if format == "json":
+        return metrics.registry.as_json()
+    if format != "prometheus":
+        raise HTTPException(status_code=400, detail="Format must be 'prometheus' or 'json'")
+    return Response(metrics.registry.prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/profile")
+async def profile_endpoint(command: dict, user: dict = Depends(require_user)):
+    """
+    Sample the event loop and MQTT network threads for `duration` seconds
+    (optionally every thread, with "all_threads": true). Collapsed stacks for
+    flamegraphs and a pstats file are written to logs/, see /logs.
+    """
+    duration = command.get("duration", 10)
+    if not isinstance(duration, (int, float)) or isinstance(duration, bool):
+        raise HTTPException(status_code=400, detail="Duration must be a number of seconds")
+    threads = {threading.get_ident(): "asyncio-loop"}
+    network_thread = mqtt.mqtt_client.network_thread  # paho's loop_start() thread, or the loopback broker's
+    if network_thread is not None and network_thread.ident is not None:
+        threads[network_thread.ident] = "mqtt-network"
+    try:
+        result = await run_in_threadpool(profiler.profile, duration, threads, all_threads=bool(command.get("all_threads", False)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    print(f"Profile {result['files']} captured by {user['username']}")
+    return result
 
 @app.post("/toggle_calibration")
 async def toggle_calibration(command: dict):
@@ -113,7 +198,7 @@ async def toggle_calibration(command: dict):
     print(f"Setting calibration mode to {flag}")
     #data_interface.CALIBRATION_FLAG = not data_interface.CALIBRATION_FLAG
     data_interface.CALIBRATION_FLAG = flag
-    data_interface.data_store = {}
+    data_interface.data_store.clear()
     if flag:
         return {"status": "Calibration mode enabled"}
     else:
@@ -123,10 +208,16 @@ async def toggle_calibration(command: dict):
 async def start_saving_data():
     data_interface.new_data_file()
     #data_interface.SAVE_DATA_FLAG = True
-    data_command = {"type":"logger","action":"start_logging","filename":f"/home/admin/Desktop/novaOps-back/backend/app/logs/{data_interface.DATA_FILE}"}
-    mqtt.mqtt_client.publish(mqtt.COMMAND_TOPIC, json.dumps(data_command))
+    data_command = {"type":"logger","action":"start_logging","filename":f"/home/admin/Desktop/novaOps-back/backend/app/logs/{data_interface.logger_file()}"}
+    try:
+        await mqtt.publish_command(data_command)
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Logger command {e}; it was withdrawn and will not be sent")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
     command_interface.new_log_file()
     command_interface.SAVE_LOG_FLAG = True
+    log_export.write_session_manifest(data_interface.DATA_FILE, command_interface.LOG_FILE)
     return {"status": f"Saving data to {data_interface.DATA_FILE}"}
 
 
@@ -134,8 +225,18 @@ async def start_saving_data():
 async def stop_saving_data():
     #data_interface.SAVE_DATA_FLAG = False
     data_command = {"type":"logger","action":"stop_logging"}
-    mqtt.mqtt_client.publish(mqtt.COMMAND_TOPIC, json.dumps(data_command))
-    command_interface.SAVE_LOG_FLAG = False
+    try:
+        await mqtt.publish_command(data_command)
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Logger command {e}; it was withdrawn and will not be sent")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Stop the backend's logs even if the Pi was not reached, with a
+        # final flush of anything still buffered for the data and command logs
+        command_interface.SAVE_LOG_FLAG = False
+        data_interface.stop_saving_data()
+        command_interface.close_log_file()
     #data_interface.DATA_FILE = None
     return {"status": "Stopped saving data"}
 
@@ -147,17 +248,149 @@ async def toggle_saving_data():
         data_interface.SAVE_DATA_FLAG = True
         return {"status": f"Saving data to {data_interface.DATA_FILE}"}
     else:
-        data_interface.SAVE_DATA_FLAG = False
+        data_interface.stop_saving_data()
         return {"status": "Stopped saving data"}
 
+@app.post("/set_data_format")
+async def set_data_format(command: dict):
+    """
+    Choose the format for data files created from now on: "csv" or "binary".
+    """
+    data_format = command.get("format")
+    if data_format not in data_interface.DATA_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of {list(data_interface.DATA_FORMATS)}")
+    data_interface.DATA_FORMAT = data_format
+    return {"status": f"Data format set to {data_format}"}
+
+def download_response(request: Request, path, filename, media_type, chunks=None, compress=None):
+    """
+    Serve a log file, compressed when asked for.
+
+    `compress` ("gzip", "zstd" or "none") downloads a compressed file as-is,
+    e.g. data.csv.gz. Otherwise the encoding is negotiated from Accept-Encoding
+    and sent as Content-Encoding, so browsers save the plain file. `chunks`
+    replaces the file's contents with a generated stream (e.g. a CSV export).
+    """
+    if compress is not None and compress != "none" and compress not in compression.available_encodings():
+        raise HTTPException(status_code=400, detail=f"compress must be one of {compression.available_encodings() + ['none']}")
+    as_file = compress is not None and compress != "none"
+    encoding = compress if as_file else (None if compress == "none" else compression.negotiate(request.headers.get("accept-encoding")))
+    if encoding is None:
+        if chunks is not None:
+            return StreamingResponse(chunks, media_type=media_type, headers={"Content-Disposition": f"attachment; filename={filename}"})
+        return FileResponse(path, media_type=media_type, filename=filename, headers={"Content-Disposition": f"attachment; filename={filename}"})
+    if as_file:
+        filename += compression.EXTENSIONS[encoding]
+        media_type = compression.MEDIA_TYPES[encoding]
+        headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    else:
+        headers = {"Content-Disposition": f"attachment; filename={filename}", "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+    precompressed = compression.compressed_path(path, encoding) if chunks is None else None
+    if precompressed is not None:
+        return FileResponse(precompressed, media_type=media_type, headers=headers)
+    # a sync generator, so compression runs in the thread pool
+    stream = compression.iter_compressed(chunks if chunks is not None else compression.iter_file(path), encoding)
+    return StreamingResponse(stream, media_type=media_type, headers=headers)
+
 @app.get("/download_data_file")
-async def download_data():
-    # Download the CSV file
+async def download_data(request: Request, format: str = "csv", compress: Optional[str] = None):
+    # Download the CSV file, exporting binary data files to CSV on demand
     if data_interface.DATA_FILE:
-        return FileResponse(f"logs/{data_interface.DATA_FILE}", media_type='text/csv', filename=data_interface.DATA_FILE,  headers={"Content-Disposition": f"attachment; filename={data_interface.DATA_FILE}"})
+        path = f"logs/{data_interface.DATA_FILE}"
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="No data file found")
+        if data_interface.DATA_FILE.endswith(".bin") and format == "csv":
+            filename = data_interface.DATA_FILE[:-len(".bin")] + ".csv"
+            try:
+                reader = binary_log.BinaryLogReader(path)
+            except ValueError as e:
+                # not written by the backend (e.g. an older Pi log under this name), so it is already text
+                print(f"Serving {path} as-is: {e}")
+                return download_response(request, path, filename, 'text/csv', compress=compress)
+            return download_response(request, path, filename, 'text/csv', chunks=reader.iter_csv(), compress=compress)
+        media_type = 'application/octet-stream' if data_interface.DATA_FILE.endswith(".bin") else 'text/csv'
+        return download_response(request, path, data_interface.DATA_FILE, media_type, compress=compress)
     else:
         raise HTTPException(status_code=404, detail="No data file found")
 
+@app.get("/download_log_file")
+async def download_log(request: Request, compress: Optional[str] = None):
+    # Download the command log of the current test
+    if command_interface.LOG_FILE:
+        path = f"logs/{command_interface.LOG_FILE}"
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="No log file found")
+        return download_response(request, path, command_interface.LOG_FILE, 'text/csv', compress=compress)
+    else:
+        raise HTTPException(status_code=404, detail="No log file found")
+
+@app.post("/set_log_compression")
+async def set_log_compression(command: dict):
+    """
+    Turn background compression of closed data and command logs on or off,
+    so later downloads can be served pre-compressed.
+    """
+    enabled = command.get("enabled")
+    if not isinstance(enabled, bool):
+        raise HTTPException(status_code=400, detail="'enabled' must be true or false")
+    compression.COMPRESS_CLOSED_LOGS = enabled
+    return {"status": f"Log compression {'enabled' if enabled else 'disabled'}"}
+
+@app.get("/logs")
+async def list_logs_endpoint():
+    return {"files": await run_in_threadpool(log_export.list_logs)}
+
+@app.api_route("/logs/{filename}", methods=["GET", "HEAD"])
+async def get_log_file(request: Request, filename: str):
+    """
+    Serve any file in logs/, with Range and If-Range support so interrupted
+    downloads can be resumed.
+    """
+    try:
+        path = log_reader.resolve_log_file(filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    size = os.path.getsize(path)
+    etag, last_modified = log_export.file_validators(path)
+    headers = {"Accept-Ranges": "bytes", "ETag": etag, "Last-Modified": last_modified, "Content-Disposition": f"attachment; filename={filename}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    byte_range = None
+    if log_export.if_range_matches(request.headers.get("if-range"), etag, last_modified):
+        try:
+            byte_range = log_export.parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        if request.method == "HEAD":
+            return Response(headers={**headers, "Content-Length": str(size)}, media_type="application/octet-stream")
+        return FileResponse(path, media_type="application/octet-stream", headers=headers)
+    first, last = byte_range
+    headers.update({"Content-Range": f"bytes {first}-{last}/{size}", "Content-Length": str(last - first + 1)})
+    if request.method == "HEAD":
+        return Response(status_code=206, headers=headers, media_type="application/octet-stream")
+    return StreamingResponse(log_export.iter_range(path, first, last), status_code=206, media_type="application/octet-stream", headers=headers)
+
+@app.get("/download_session")
+async def download_session(request: Request, data_file: Optional[str] = None, compress: Optional[str] = None):
+    """
+    Stream a tar bundle of a test session: its data file, command log and
+    config snapshot. Defaults to the current data file.
+    """
+    data_file = data_file or data_interface.DATA_FILE
+    if not data_file:
+        raise HTTPException(status_code=404, detail="No data file found")
+    try:
+        names = log_export.session_files(data_file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    filename = log_export.session_stem(data_file) + ".tar"
+    return download_response(request, None, filename, "application/x-tar", chunks=log_export.iter_tar(names), compress=compress)
+
 @app.get("/dummy_data")
 async def dummy_data_endpoint():
     return generate_data()
@@ -247,60 +480,55 @@ async def get_sensors():
     # Return the sensors as JSON
     return sensors
 
-# TODO: use ORJSON for the data stream
 @app.get("/front")
-async def get_actuator_data():
-    try:
-        while True:
-            #await generate_sensor_data()
-            #await get_timestamp()
-            return data_interface.processed_data 
-    except:
-        return {} 
+async def get_actuator_data(request: Request):
+    return snapshot_response(request, data_interface.processed_snapshot.current)
+
+# One producer per stream: each frame is encoded once and shared by every client
+raw_data_hub = BroadcastHub("ws_raw_data", lambda: mqtt.raw_snapshot.current.text)
+processed_hub = BroadcastHub("processed", lambda: data_interface.processed_snapshot.current.text)  # /ws and /ws_basic
+delta_hub = DeltaHub("delta", lambda: data_interface.processed_snapshot.current)  # /ws_basic?mode=delta
+binary_hub = BinaryHub("binary", lambda: data_interface.processed_snapshot.current)  # /ws_binary
 
 @app.websocket("/ws_raw_data")
 async def websocket_data_endpoint(websocket: WebSocket):
     await websocket.accept()
-    while True:
-        #await mqtt.generate_sensor_data()
-        await websocket.send_json(mqtt.raw_data)
-        await asyncio.sleep(0.1)
+    await raw_data_hub.serve(websocket)
 
 @app.websocket("/ws_basic")
-async def websocket_basic_endpoint(websocket: WebSocket):
+async def websocket_basic_endpoint(websocket: WebSocket, mode: str = "full"):
+    # mode=delta streams only sensors that changed beyond their dead-band, with periodic keyframes
     await websocket.accept()
-    try:
-        while True:
-            #await mqtt.generate_sensor_data()
-            ws_data = data_interface.format_for_ws()
-            await websocket.send_json(ws_data)
-            await asyncio.sleep(0.1)
-    except WebSocketDisconnect:
-        print(f"Client disconnected")
+    hub = delta_hub if mode == "delta" else processed_hub
+    await hub.serve(websocket)
+    print(f"Client disconnected")
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+@app.websocket("/ws_binary")
+async def websocket_binary_endpoint(websocket: WebSocket):
+    # Schema as JSON text once, then packed float32 frames (see binary_stream)
     await websocket.accept()
-    try:
-        while True:
-            await websocket.send_json(data_interface.processed_data)
-            # Check if any commands are received
-            try:
-                message = await asyncio.wait_for(websocket.receive_text(), timeout=0.5)
-                command = json.loads(message)
-
-                # Handle actuator toggling
-                print(command)
+    await binary_hub.serve(websocket)
 
-            except asyncio.TimeoutError:
-                # Continue sending sensor updates if no command is received
-                pass
+@app.websocket("/ws_subscribe")
+async def websocket_subscribe_endpoint(websocket: WebSocket):
+    # Client sends {"sensors": [...], "rate": Hz}; receives min/max/mean per bucket for those sensors
+    await websocket.accept()
+    await subscriptions.serve(websocket)
 
-            # Wait for 1 second before sending the next update
-            await asyncio.sleep(0.1)
+async def handle_ws_command(message):
+    try:
+        command = json.loads(message)
+    except json.JSONDecodeError:
+        print(f"Invalid command received: {message}")
+        return
+    # Handle actuator toggling
+    print(command)
 
-    except WebSocketDisconnect:
-        print(f"Client disconnected")
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    await processed_hub.serve(websocket, on_message=handle_ws_command)
+    print(f"Client disconnected")
 
 @app.websocket("/ws_auth")
 async def websocket_endpoint2(websocket: WebSocket):
@@ -337,17 +565,17 @@ async def send_command(command: dict):
     # Servos: {"id": "1", "angle": 90}
     # Relays: {"id": "1", "state": "0"}
     # print(f"Received command: {command}")
+    started = time.monotonic()
     try:
         #command_interface.validate_command(command)  # Validate command structure
-        # Update processed data with the new actuator state
-        command_list = await command_interface.convert_command(command)  # Convert command based on config
-        for parsed_command in command_list:
-            # Publish each command to the MQTT broker
-            #mqtt.publish_command(command)
-            if parsed_command is None:
-                raise HTTPException(status_code=400, detail="Invalid command format")
-            mqtt.mqtt_client.publish(mqtt.COMMAND_TOPIC, json.dumps(parsed_command))
-            await asyncio.sleep(0.01)  # Add a small delay between commands to avoid flooding the broker
+        # Pre-serialized payloads, compiled from the config when it was loaded
+        payloads = command_interface.command_payloads(command)
+        # Track it before publishing, so telemetry confirming it is never missed
+        pending = command_tracker.tracker.track(command["name"], command["state"], payloads, started)
+        # Queue them for the dispatcher, then wait until the broker acknowledges each one
+        tickets = [await mqtt.command_dispatcher.submit(payload) for payload in payloads]
+        await asyncio.gather(*(ticket.wait() for ticket in tickets))
+        command_tracker.tracker.acknowledged(pending, tickets)
 
         # Update the actuator states with the new command
         #try:
@@ -357,13 +585,20 @@ async def send_command(command: dict):
 
         if command_interface.SAVE_LOG_FLAG:
             command_interface.save_log(command)
-        return {"status": "Command sent"}
+        return {"status": "Command sent", "timings": [ticket.timings() for ticket in tickets]}
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Command {e}; it was withdrawn and will not be sent")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/close_all")
 async def close_all_endpoint():
-    status = await command_interface.set_all_to_closed()
+    try:
+        status = await command_interface.set_all_to_closed()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     """
     for i in range(16):
         command = {
@@ -374,26 +609,32 @@ async def close_all_endpoint():
         mqtt.mqtt_client.publish(mqtt.COMMAND_TOPIC, json.dumps(command))
         time.sleep(0.1)  # Add a small delay between commands to avoid flooding the broker
     """
-    return {"status": "Commands sent"}
+    return status
     
 @app.get("/open_all")
 async def open_all_endpoint():
     #status = mqtt.set_all_to_closed()
+    tickets = []
     for i in range(16):
         command = {
             "type": "relay",
             "id": i,
             "state": 0
         }
-        mqtt.mqtt_client.publish(mqtt.COMMAND_TOPIC, json.dumps(command))
-        time.sleep(0.1)  # Add a small delay between commands to avoid flooding the brokerr
-    return {"status": "Commands sent"} 
+        tickets.append(await mqtt.command_dispatcher.submit(json.dumps(command)))
+    # the dispatcher's in-flight window paces these, instead of sleeping between them
+    results = await asyncio.gather(*(ticket.wait() for ticket in tickets), return_exceptions=True)
+    errors = [str(result) for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise HTTPException(status_code=500, detail=f"{len(errors)} of {len(tickets)} commands failed: {errors[0]}")
+    return {"status": "Commands sent"}
 
 @app.get("/set_to_defaults")
 async def set_to_defaults_endpoint():
     try:
-        mqtt.set_to_defaults()
-        return {"status": "Default commands sent"}
+        return await command_interface.set_to_defaults()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -411,24 +652,65 @@ class PlotRequest(BaseModel):
 
 @app.post("/generate_plot")
 async def generate_plot(req: PlotRequest):
+    # Rendered in a worker process, and cached per request and file version
     try:
-        plot_path = plotting.plot_from_csv(
-            csv_file=req.csv_file,
-            time_bounds=req.time_bounds,
-            y1_cols=req.y1_cols,
-            y2_cols=req.y2_cols,
-            smooth_cols=req.smooth_cols,
-            smoothing_window=req.smoothing_window,
-            y1_unit=req.y1_unit,
-            y2_unit=req.y2_unit,
-            show=req.show
-        )
-        # Option 1: Return the file directly
-        return FileResponse(plot_path, media_type="image/png", filename=os.path.basename(plot_path))
-        # Option 2: Return just the path
-        # return JSONResponse({"plot_path": plot_path})
+        plot_path = await plotting.render(req.model_dump())
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=400)
+    return FileResponse(plot_path, media_type="image/png", filename=os.path.basename(plot_path))
+
+@app.get("/plot_stats")
+async def plot_stats_endpoint():
+    return plotting.stats()
+
+class QueryRequest(BaseModel):
+    file: str
+    columns: List[str]
+    start: Optional[float] = None  # seconds, as in the file's Timestamp column
+    end: Optional[float] = None
+    max_points: Optional[int] = 1000
+    method: Optional[str] = "lttb"  # "lttb" or "minmax"
+    format: Optional[str] = "json"  # "json" or "binary"
+
+def pack_series(series):
+    """
+    Binary layout: uint32 column count, then per column a uint16 name length,
+    the UTF-8 name, a uint32 point count and float64 times followed by float64 values.
+    """
+    parts = [struct.pack('<I', len(series))]
+    for name, (x, y) in series.items():
+        encoded = name.encode('utf-8')
+        parts.append(struct.pack('<H', len(encoded)) + encoded + struct.pack('<I', len(x)))
+        parts.append(np.asarray(x, dtype='<f8').tobytes() + np.asarray(y, dtype='<f8').tobytes())
+    return b"".join(parts)
+
+@app.post("/query_data")
+async def query_data(req: QueryRequest):
+    """
+    Downsampled time series for some columns of a recorded data file.
+    """
+    if req.max_points is None or req.max_points < 3:
+        raise HTTPException(status_code=400, detail="max_points must be at least 3")
+    try:
+        # streamed from disk in a worker thread so telemetry keeps flowing
+        series = await run_in_threadpool(
+            log_reader.query_range, req.file, req.columns, req.start, req.end, req.max_points, req.method
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if req.format == "binary":
+        return Response(pack_series(series), media_type="application/octet-stream")
+    return {
+        "file": req.file,
+        "method": req.method,
+        "series": {name: {"t": x.tolist(), "v": y.tolist()} for name, (x, y) in series.items()},
+    }
 
 @app.get("/get_csv_files")
 async def get_csv_files():
@@ -436,7 +718,6 @@ async def get_csv_files():
     Get a list of all CSV files in the logs directory.
     """
     try:
-        csv_files = [f for f in os.listdir("logs") if f.endswith(".csv")]
         return {"csv_files": plotting.get_csv_data()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
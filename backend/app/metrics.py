@@ -0,0 +1,194 @@
+import bisect
+import time
+from collections import deque
+
+# Bucket upper bounds in milliseconds, roughly 1-2.5-5 per decade up to a minute
+LATENCY_BUCKETS_MS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 60000]
+# Finer buckets for per-message work on the telemetry path, from 10 us to 100 ms
+PROCESSING_BUCKETS_MS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100]
+PREFIX = "novaops_"
+RATE_WINDOW = 10.0  # seconds a Rate gauge averages over
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Counting is O(log buckets) and memory is
+    constant, so it can run for a whole test campaign. Percentiles are
+    estimated by linear interpolation inside the bucket they fall in.
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = list(bounds)
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def observe_ns(self, elapsed_ns):
+        """Record a time.perf_counter_ns() difference, in milliseconds."""
+        self.observe(elapsed_ns / 1e6)
+
+    def percentile(self, p):
+        """Estimated value below which `p` percent of observations fall."""
+        if self.count == 0:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / count
+                return min(max(estimate, self.min), self.max)
+            seen += count
+        return self.max
+
+    def summary(self):
+        def rounded(value):
+            return None if value is None else round(value, 2)
+        return {
+            "count": self.count,
+            "mean": rounded(self.sum / self.count) if self.count else None,
+            "p50": rounded(self.percentile(50)),
+            "p95": rounded(self.percentile(95)),
+            "p99": rounded(self.percentile(99)),
+            "max": rounded(self.max),
+        }
+
+
+class Counter:
+    """A monotonically increasing count. Each counter should have a single writer thread."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Rate:
+    """
+    Callback gauge for a counter's rate per second over about the last
+    `window` seconds, for readers of the JSON metrics that have no rate() of
+    their own. Reading it does not reset it, so several readers see the
+    same rate.
+    """
+
+    def __init__(self, counter, window=RATE_WINDOW):
+        self.counter = counter
+        self.window = window
+        self._samples = deque([(time.monotonic(), counter.value)])  # (time, value) at each read
+
+    def __call__(self):
+        now, value = time.monotonic(), self.counter.value
+        samples = self._samples
+        # measure from the newest sample that is at least `window` old
+        while len(samples) > 1 and now - samples[1][0] >= self.window:
+            samples.popleft()
+        last_time, last_value = samples[0]
+        samples.append((now, value))
+        return round((value - last_value) / (now - last_time), 2) if now > last_time else 0.0
+
+
+class Registry:
+    """
+    Named metrics for the /metrics endpoint.
+
+    Counters and histograms are updated in place on the hot path. Values
+    other modules already keep (queue depths, client counts, ...) are
+    registered as callbacks and only read when the metrics are scraped.
+    A callback returns a number, or a {label value: number} dict for the
+    metric's `label`.
+
+    Histograms record milliseconds, so their names end in "_ms". Prometheus
+    gets them in seconds, under the same name ending in "_seconds".
+    """
+
+    def __init__(self):
+        self._metrics = {}  # name -> (kind, help, source, label)
+
+    def counter(self, name, help):
+        counter = Counter()
+        self._metrics[name] = ("counter", help, counter, None)
+        return counter
+
+    def histogram(self, name, help, bounds=LATENCY_BUCKETS_MS):
+        if not name.endswith("_ms"):
+            raise ValueError(f"Histogram '{name}' records milliseconds, so its name must end in '_ms'")
+        histogram = Histogram(bounds)
+        self._metrics[name] = ("histogram", help, histogram, None)
+        return histogram
+
+    def gauge(self, name, help, callback, label=None):
+        self._metrics[name] = ("gauge", help, callback, label)
+
+    def counter_callback(self, name, help, callback, label=None):
+        self._metrics[name] = ("counter", help, callback, label)
+
+    def rate(self, name, help, counter):
+        """A Rate of `counter`, in the JSON metrics only. Prometheus takes rate() of the counter itself."""
+        self._metrics[name] = ("rate", help, Rate(counter), None)
+
+    def _values(self, source):
+        return source() if callable(source) else source.value
+
+    def as_json(self):
+        metrics = {}
+        for name, (kind, _, source, label) in self._metrics.items():
+            try:
+                metrics[name] = source.summary() if kind == "histogram" else self._values(source)
+            except Exception as e:
+                metrics[name] = None
+                print(f"Error reading metric {name}: {e}")
+        return metrics
+
+    def prometheus(self):
+        """Prometheus text exposition format. Histograms are exported in seconds."""
+        lines = []
+        for name, (kind, help, source, label) in self._metrics.items():
+            if kind == "rate":
+                continue
+            full_name = PREFIX + name
+            if kind == "histogram":
+                full_name = full_name[:-len("_ms")] + "_seconds"
+            lines.append(f"# HELP {full_name} {help}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(source.bounds, source.counts):
+                    cumulative += count
+                    lines.append(f'{full_name}_bucket{{le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'{full_name}_bucket{{le="+Inf"}} {source.count}')
+                lines.append(f"{full_name}_sum {source.sum / 1000:.9g}")
+                lines.append(f"{full_name}_count {source.count}")
+                continue
+            try:
+                value = self._values(source)
+            except Exception as e:
+                print(f"Error reading metric {name}: {e}")
+                continue
+            if isinstance(value, dict):
+                for label_value, item in value.items():
+                    escaped = str(label_value).replace("\\", "\\\\").replace('"', '\\"')
+                    lines.append(f'{full_name}{{{label}="{escaped}"}} {item}')
+            else:
+                lines.append(f"{full_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
@@ -1,25 +1,47 @@
-import paho.mqtt.client as mqtt
+import os
 from fastapi import HTTPException
 import json
 from datetime import datetime
-import asyncio
 import time
 import config_parser
 import data_interface
+import command_tracker
+from metrics import registry, PROCESSING_BUCKETS_MS
+from ingest import IngestBridge
+from dispatcher import CommandDispatcher
+from snapshot import SnapshotChannel
+from transport import PahoTransport, LoopbackTransport
 
 MQTT_BROKER = "host.docker.internal" # use broker.hivemq.com for testing on PCs
 MQTT_PORT = 1883 # TCP Port
 DATA_TOPIC = "novaground/telemetry"
 COMMAND_TOPIC = "novaground/command"
+# "paho" connects to MQTT_BROKER; "loopback" runs with an in-process broker and no network
+MQTT_TRANSPORT = os.environ.get("MQTT_TRANSPORT", "paho")
 
 raw_data = {}
+raw_snapshot = SnapshotChannel(raw_data)  # versioned, read-only view of raw_data
 processed_data = {"sensors": [], "actuators": [], "gpios": []}
 data_store = []
 processed_gpios = []
 
+async def handle_telemetry(payload):
+    await data_interface.process_data(payload)
+    # Confirm pending commands against the actuator states just reported
+    command_tracker.tracker.observe(payload)
+
+# Telemetry is processed by a consumer task on the app's event loop, not on the paho thread
+ingest_bridge = IngestBridge(handle_telemetry)
+
+def make_transport(kind=MQTT_TRANSPORT):
+    if kind == "paho":
+        return PahoTransport(MQTT_BROKER, MQTT_PORT)
+    if kind == "loopback":
+        return LoopbackTransport()
+    raise ValueError(f"Unknown MQTT transport '{kind}', expected 'paho' or 'loopback'")
 
 # MQTT client setup
-mqtt_client = mqtt.Client()
+mqtt_client = make_transport()
 
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
@@ -28,9 +50,18 @@ def on_connect(client, userdata, flags, rc):
     else:
         print("Failed to connect to MQTT broker")
 
+messages_received = registry.counter("mqtt_messages_total", "Telemetry messages received from the broker")
+bytes_received = registry.counter("mqtt_received_bytes_total", "Telemetry payload bytes received from the broker")
+decode_errors = registry.counter("mqtt_decode_errors_total", "Telemetry payloads that were empty, not JSON or not an object")
+registry.rate("mqtt_messages_per_second", "Telemetry messages per second over the last few seconds", messages_received)
+decode_time = registry.histogram("mqtt_decode_ms", "Time to decode a telemetry payload", PROCESSING_BUCKETS_MS)
+
 def on_message(client, userdata, msg):
     global raw_data
     global processed_data
+    messages_received.inc()
+    bytes_received.inc(len(msg.payload))
+    start = time.perf_counter_ns()
     # Decode the payload from bytes to string
     payload_str = msg.payload.decode('utf-8', errors='replace').strip()
 
@@ -40,25 +71,43 @@ def on_message(client, userdata, msg):
         # Check if the payload is non-empty before attempting to decode as JSON
         if payload_str:
             raw_data = json.loads(payload_str)  # Attempt to decode the payload into JSON
+            decode_time.observe_ns(time.perf_counter_ns() - start)
             # print(f"Decoded data: {data}"
             # Make sure payload is a dictionary before using it in the process
             if isinstance(raw_data, dict):
-                asyncio.run(data_interface.process_data(raw_data))
+                raw_snapshot.publish(raw_data)
+                ingest_bridge.submit(raw_data)
             else:
+                decode_errors.inc()
                 print("Received payload is not a valid dictionary")
         else:
+            decode_errors.inc()
             print("Received empty payload.")
     except json.JSONDecodeError as e:
+        decode_errors.inc()
         print(f"Error decoding JSON: {e} - Payload: {msg.payload.decode('utf-8')}")
     except Exception as e:
         print(f"Unexpected error: {e}")
 
 mqtt_client.on_connect = on_connect
+# Commands are published from one task on the app's event loop, with a bounded in-flight window
+command_dispatcher = CommandDispatcher(mqtt_client, COMMAND_TOPIC)
 mqtt_client.on_message = on_message
-mqtt_client.connect(MQTT_BROKER, MQTT_PORT)
 
-# Start the MQTT loop
-mqtt_client.loop_start()
+registry.gauge("ingest_queue_depth", "Telemetry messages waiting to be processed", lambda: ingest_bridge.stats()["queue_depth"])
+registry.counter_callback("ingest_dropped_total", "Telemetry messages dropped before processing",
+                          lambda: {reason: getattr(ingest_bridge, f"dropped_{reason}") for reason in ("overflow", "not_running")}, label="reason")
+registry.counter_callback("ingest_errors_total", "Telemetry messages that failed processing", lambda: ingest_bridge.errors)
+registry.gauge("command_in_flight", "Commands published but not yet acknowledged", lambda: command_dispatcher.in_flight)
+registry.counter_callback("commands_total", "Commands through the dispatcher, by outcome",
+                          lambda: {outcome: getattr(command_dispatcher, outcome) for outcome in ("acked", "failed", "timed_out")}, label="outcome")
+
+def connect():
+    """Connect to the broker and start the transport's network thread. Called on app startup, not on import."""
+    mqtt_client.connect()
+
+def disconnect():
+    mqtt_client.disconnect()
 
 async def process_mqtt_message(payload):
     # Make sure payload is a dictionary before using it in the process
@@ -69,10 +118,13 @@ async def process_mqtt_message(payload):
         print("Received payload is not a valid dictionary")
 
 async def publish_command(command):
+    """Publish a command through the dispatcher and wait for the broker to acknowledge it."""
     try:
-        mqtt_client.publish(COMMAND_TOPIC, json.dumps(command))
-        return {"status": "Command sent"}
+        return await command_dispatcher.send(json.dumps(command))
+    except TimeoutError as e:
+        # keep the type, so callers can tell an unacknowledged command from a failed one
+        print(f"Error publishing command: {e} - Payload: {json.dumps(command)}")
+        raise
     except Exception as e:
         print(f"Error publishing command: {e} - Payload: {json.dumps(command)}")
         raise Exception(f"Error publishing command: {e} - Payload: {json.dumps(command)}")
-    
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import json
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # render to files; the server has no display
+import matplotlib.pyplot as plt
+from log_reader import LOGS_DIR, resolve_log_file, read_csv_header, parse_elapsed, iter_chunks
+import binary_log
+
+MAX_RENDERS = 2  # worker processes, so at most this many plots render at once
+MAX_PENDING = 8  # distinct renders queued or running before new ones are refused
+PLOT_CACHE_SIZE = 50  # rendered plots kept in the logs directory
+PLOT_PREFIX = "plot_"
+DPI = 120
+
+_executor = None
+_pending = {}  # cache key -> task rendering that plot, shared by identical requests
+render_stats = {"requests": 0, "cache_hits": 0, "renders": 0, "errors": 0, "rejected": 0}
+
+
+def get_csv_data():
+    """Data files in the logs directory that can be plotted, newest first."""
+    files = [f for f in os.listdir(LOGS_DIR) if f.endswith(".csv") or f.endswith(".bin")]
+    return sorted(files, key=lambda f: os.path.getmtime(os.path.join(LOGS_DIR, f)), reverse=True)
+
+
+def smooth(values, window):
+    """Centred moving average over `window` samples, ignoring NaNs."""
+    if not window or window <= 1 or len(values) < window:
+        return values
+    kernel = np.ones(window)
+    finite = np.isfinite(values)
+    sums = np.convolve(np.where(finite, values, 0.0), kernel, mode="same")
+    counts = np.convolve(finite.astype(np.float64), kernel, mode="same")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def _columns(path):
+    if binary_log.is_binary_log(path):
+        return binary_log.BinaryLogReader(path).columns
+    return read_csv_header(path)
+
+
+def load_columns(path, columns, start=None, end=None):
+    """Times and a name -> values dict for the requested columns of a data file."""
+    chunks = list(iter_chunks(path, columns, start, end))
+    if not chunks:
+        return np.empty(0), {name: np.empty(0) for name in columns}
+    times = np.concatenate([chunk[0] for chunk in chunks])
+    values = np.concatenate([chunk[1] for chunk in chunks])
+    return times, {name: values[:, i] for i, name in enumerate(columns)}
+
+
+def plot_from_csv(csv_file, y1_cols, time_bounds=None, y2_cols=None, smooth_cols=None, smoothing_window=10,
+                  y1_unit=None, y2_unit=None, show=False, output=None):
+    """
+    Plot columns of a recorded data file (CSV or binary) against time and
+    save the figure as a PNG in the logs directory. Returns the PNG's path.
+
+    time_bounds is an optional [start, end] pair of Timestamp strings or
+    seconds. Columns in smooth_cols are drawn as a moving average over
+    smoothing_window samples. y2_cols go on a second axis.
+    """
+    path = resolve_log_file(csv_file)
+    y2_cols = y2_cols or []
+    smooth_cols = set(smooth_cols or [])
+    known = _columns(path)
+    missing = [name for name in list(y1_cols) + list(y2_cols) if name not in known]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in {csv_file}")
+    start = end = None
+    if time_bounds:
+        if len(time_bounds) != 2:
+            raise ValueError("time_bounds must be [start, end]")
+        start, end = (parse_elapsed(str(bound)) if bound not in (None, "") else None for bound in time_bounds)
+    times, series = load_columns(path, list(dict.fromkeys(list(y1_cols) + list(y2_cols))), start, end)
+
+    fig, ax1 = plt.subplots(figsize=(12, 6))
+    lines = []
+    for name in y1_cols:
+        y = smooth(series[name], smoothing_window) if name in smooth_cols else series[name]
+        lines += ax1.plot(times, y, label=name, linewidth=1, color=f"C{len(lines) % 10}")
+    ax1.set_xlabel("Time (s)")
+    ax1.set_ylabel(y1_unit or "")
+    ax1.grid(True, alpha=0.3)
+    if y2_cols:
+        ax2 = ax1.twinx()
+        for name in y2_cols:
+            y = smooth(series[name], smoothing_window) if name in smooth_cols else series[name]
+            lines += ax2.plot(times, y, label=name, linewidth=1, linestyle="--", color=f"C{len(lines) % 10}")
+        ax2.set_ylabel(y2_unit or "")
+    if lines:
+        ax1.legend(lines, [line.get_label() for line in lines], loc="upper left")
+    ax1.set_title(csv_file)
+    fig.tight_layout()
+
+    if output is None:
+        output = os.path.join(LOGS_DIR, f"{PLOT_PREFIX}{os.path.splitext(csv_file)[0]}.png")
+    partial = output + ".part"
+    fig.savefig(partial, dpi=DPI, format="png")
+    os.replace(partial, output)
+    if show:
+        plt.show()
+    plt.close(fig)
+    return output
+
+
+def cache_key(request, path):
+    """Hash of the plot request fields and the source file's size and modification time."""
+    stat = os.stat(path)
+    fields = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(f"{fields}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')).hexdigest()[:24]
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # Never fork this process: it runs uvicorn, the MQTT network thread and the log
+        # writer threads, and a forked child could inherit one of their locks mid-operation.
+        # Workers come from a clean forkserver (spawn where that is unavailable) that has
+        # matplotlib and this module preloaded.
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(method)
+        if method == "forkserver":
+            context.set_forkserver_preload(["plotting"])
+        _executor = ProcessPoolExecutor(max_workers=MAX_RENDERS, mp_context=context)
+    return _executor
+
+
+def _replace_executor(broken):
+    """Drop a pool whose worker died, so the next render starts a new one."""
+    global _executor
+    if _executor is broken:
+        _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _trim_cache():
+    plots = [os.path.join(LOGS_DIR, f) for f in os.listdir(LOGS_DIR) if f.startswith(PLOT_PREFIX) and f.endswith(".png")]
+    plots.sort(key=os.path.getmtime, reverse=True)
+    for old in plots[PLOT_CACHE_SIZE:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+async def _render(request, output):
+    loop = asyncio.get_running_loop()
+    try:
+        for attempt in range(2):
+            executor = _get_executor()
+            try:
+                result = await loop.run_in_executor(executor, _render_job, request, output)
+                break
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory), failing every render on that pool.
+                # Retry once on a new pool, since this plot may not be the one that killed it.
+                print("Plot worker died, restarting the render pool")
+                _replace_executor(executor)
+                if attempt:
+                    raise
+    except Exception:
+        render_stats["errors"] += 1
+        raise
+    render_stats["renders"] += 1
+    await asyncio.to_thread(_trim_cache)
+    return result
+
+
+def _render_job(request, output):
+    # runs in a worker process
+    return plot_from_csv(**request, show=False, output=output)
+
+
+async def render(request):
+    """
+    Render a plot off the event loop, or return the cached PNG of an identical
+    request against an unchanged file. Concurrent identical requests share
+    one render. Raises RuntimeError when too many renders are already queued.
+    """
+    render_stats["requests"] += 1
+    request = {key: value for key, value in request.items() if key != "show"}
+    path = resolve_log_file(request["csv_file"])
+    key = cache_key(request, path)
+    output = os.path.join(LOGS_DIR, f"{PLOT_PREFIX}{key}.png")
+    if os.path.isfile(output):
+        render_stats["cache_hits"] += 1
+        return output
+    task = _pending.get(key)
+    if task is None:
+        if len(_pending) >= MAX_PENDING:
+            render_stats["rejected"] += 1
+            raise RuntimeError("Too many plots rendering, try again shortly")
+        task = _pending[key] = asyncio.ensure_future(_render(request, output))
+        task.add_done_callback(lambda _: _pending.pop(key, None))
+    # shield so one client disconnecting does not cancel a render others wait on
+    return await asyncio.shield(task)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def stats():
+    return {**render_stats, "pending": len(_pending), "workers": MAX_RENDERS}
@@ -0,0 +1,162 @@
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from log_reader import LOGS_DIR
+
+PROFILE_INTERVAL = 0.005  # seconds between samples (200 Hz)
+MAX_PROFILE_DURATION = 120  # seconds
+PROFILE_PREFIX = "profile_"
+COLLAPSED_SUFFIX = ".collapsed"
+PSTATS_SUFFIX = ".pstats"
+
+_running = threading.Lock()  # one profile at a time
+
+
+def _label(frame_key):
+    filename, _, function = frame_key
+    return f"{os.path.basename(filename)}:{function}"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the stacks of chosen threads from a
+    thread of its own, using sys._current_frames(). Nothing is hooked into
+    the profiled threads, so their cost is only the GIL time of each sample.
+
+    `threads` maps thread idents to the names used as the root of their
+    stacks. With `all_threads`, every other live thread is sampled too.
+    """
+
+    def __init__(self, threads, interval=PROFILE_INTERVAL, all_threads=False):
+        self.threads = dict(threads)
+        self.interval = interval
+        self.all_threads = all_threads
+        self.stacks = Counter()  # (thread name, ((filename, first line, function), ...) outermost first) -> samples
+        self.samples = 0
+        self.duration = 0.0
+
+    def _targets(self):
+        if not self.all_threads:
+            return self.threads
+        me = threading.get_ident()
+        targets = {thread.ident: thread.name for thread in threading.enumerate() if thread.ident != me}
+        targets.update(self.threads)
+        return targets
+
+    def sample(self):
+        frames = sys._current_frames()
+        for ident, name in self._targets().items():
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[(name, tuple(stack))] += 1
+        self.samples += 1
+
+    def run(self, duration):
+        """Sample every `interval` seconds for `duration` seconds. Blocks the calling thread."""
+        start = time.perf_counter()
+        deadline = start + duration
+        next_sample = start
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now < next_sample:
+                time.sleep(min(next_sample, deadline) - now)
+                continue
+            self.sample()
+            next_sample += self.interval
+            if next_sample < now:  # fell behind; skip missed samples rather than bursting
+                next_sample = now + self.interval
+        self.duration = time.perf_counter() - start
+
+    @property
+    def sample_time(self):
+        """Seconds of wall time each sample stands for."""
+        return self.duration / self.samples if self.samples else self.interval
+
+    def collapsed(self):
+        """Collapsed stacks, one 'thread;outer;...;inner count' line each, for flamegraph.pl or speedscope."""
+        lines = [
+            ";".join([thread] + [_label(frame) for frame in stack]) + f" {count}"
+            for (thread, stack), count in self.stacks.items()
+        ]
+        lines.sort()
+        return "\n".join(lines) + "\n"
+
+    def stats(self):
+        """
+        The samples in the dict layout cProfile dumps, so pstats and tools such
+        as snakeviz can read them: call counts are sample counts, and times
+        are samples multiplied by the sampling period.
+        """
+        own = Counter()
+        total = Counter()
+        callers = {}
+        for (_, stack), count in self.stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack):  # recursive functions count once per sample
+                total[frame] += count
+            for caller, callee in set(zip(stack, stack[1:])):
+                edges = callers.setdefault(callee, Counter())
+                edges[caller] += count
+        period = self.sample_time
+        stats = {}
+        for frame, count in total.items():
+            edges = {caller: (n, n, 0.0, n * period) for caller, n in callers.get(frame, {}).items()}
+            stats[frame] = (count, count, own[frame] * period, count * period, edges)
+        return stats
+
+    def top(self, limit=20):
+        """The functions with the most samples on top of the stack."""
+        own = Counter()
+        for (_, stack), count in self.stacks.items():
+            own[stack[-1]] += count
+        return [
+            {"function": _label(frame), "line": frame[1], "samples": count, "percent": round(100 * count / self.samples, 1)}
+            for frame, count in own.most_common(limit)
+        ]
+
+    def write(self, stem):
+        """Write `stem`.collapsed and `stem`.pstats to logs/. Returns the file names."""
+        collapsed_file = stem + COLLAPSED_SUFFIX
+        pstats_file = stem + PSTATS_SUFFIX
+        with open(os.path.join(LOGS_DIR, collapsed_file), 'w') as file:
+            file.write(self.collapsed())
+        with open(os.path.join(LOGS_DIR, pstats_file), 'wb') as file:
+            marshal.dump(self.stats(), file)
+        return [collapsed_file, pstats_file]
+
+
+def profile(duration, threads, interval=PROFILE_INTERVAL, all_threads=False):
+    """
+    Profile `threads` for `duration` seconds and write the results to logs/.
+    Blocks, so run it off the event loop. Raises RuntimeError if a profile
+    is already running.
+    """
+    if not 0 < duration <= MAX_PROFILE_DURATION:
+        raise ValueError(f"Duration must be between 0 and {MAX_PROFILE_DURATION} seconds")
+    if not _running.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        profiler = SamplingProfiler(threads, interval, all_threads)
+        profiler.run(duration)
+        files = profiler.write(PROFILE_PREFIX + datetime.now().strftime("%Y%m%d_%H%M%S"))
+    finally:
+        _running.release()
+    return {
+        "files": files,
+        "duration": round(profiler.duration, 3),
+        "samples": profiler.samples,
+        "threads": sorted({thread for thread, _ in profiler.stacks}),
+        "top": profiler.top(),
+    }
@@ -0,0 +1,106 @@
+import math
+from collections import deque
+
+
+class RollingStats:
+    """
+    Streaming mean, standard deviation, min and max over the last `window` samples.
+
+    Mean and variance use Welford's update with a matching removal step, and
+    min/max use monotonic deques, so each push is O(1) amortised. Non-finite
+    samples occupy a slot in the window but are left out of the statistics.
+    The add/remove steps accumulate rounding error over a long session, so
+    the owner of the samples should call recompute() now and then (HistoryStore
+    does once per window).
+    """
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("Rolling window must be at least 1")
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.count = 0  # finite samples in the window
+        self.mean = math.nan
+        self._m2 = 0.0
+        self._seq = 0  # samples pushed, used to expire min/max candidates
+        self._min = deque()  # (seq, value), values increasing
+        self._max = deque()  # (seq, value), values decreasing
+
+    def push(self, value, evicted=None):
+        """
+        Add a sample. `evicted` is the sample leaving the window, which the
+        caller passes once the window is full (None while it is still filling).
+        """
+        if evicted is not None and math.isfinite(evicted):
+            self._remove(evicted)
+        if math.isfinite(value):
+            self._add(value)
+
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((self._seq, value))
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((self._seq, value))
+
+        oldest = self._seq - self.window
+        while self._min and self._min[0][0] <= oldest:
+            self._min.popleft()
+        while self._max and self._max[0][0] <= oldest:
+            self._max.popleft()
+        self._seq += 1
+
+    @property
+    def pushes(self):
+        """Samples pushed since the last reset."""
+        return self._seq
+
+    def recompute(self, values):
+        """Recompute mean and variance exactly from the samples now in the window."""
+        finite = [float(value) for value in values if math.isfinite(value)]
+        self.count = len(finite)
+        if not finite:
+            self.mean = math.nan
+            self._m2 = 0.0
+            return
+        self.mean = math.fsum(finite) / self.count
+        self._m2 = math.fsum((value - self.mean) ** 2 for value in finite)
+
+    def _add(self, value):
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            self._m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def _remove(self, value):
+        if self.count <= 1:
+            self.count = 0
+            self.mean = math.nan
+            self._m2 = 0.0
+            return
+        old_mean = self.mean
+        self.count -= 1
+        self.mean = old_mean - (value - old_mean) / self.count
+        # rounding can take M2 just below zero when the window is (nearly) constant
+        self._m2 = max(self._m2 - (value - old_mean) * (value - self.mean), 0.0)
+
+    @property
+    def stddev(self):
+        """Population standard deviation of the window."""
+        if self.count == 0:
+            return math.nan
+        return math.sqrt(max(self._m2, 0.0) / self.count)
+
+    @property
+    def min(self):
+        return self._min[0][1] if self._min else math.nan
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else math.nan
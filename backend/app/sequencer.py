@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+RELAYS_PER_BOARD = 16  # relayBoard channels per physical board
+POWER_BUDGET = 6  # actuators a relay board may power at once, unless its config sets powerBudget
+SETTLE_TIME = 2.0  # seconds after powering an actuator before moving it, and before cutting power
+
+
+def board_of(relay_id):
+    return relay_id // RELAYS_PER_BOARD
+
+
+class Timeline:
+    """
+    The steps that bring one actuator (or one group sharing a power relay)
+    to a state: ("send", command) and ("wait", seconds) in order.
+
+    A powered timeline holds one slot of its relay board's power budget
+    while it runs. Its `cleanup` commands are sent even if a step fails,
+    so power is never left on.
+    """
+
+    def __init__(self, name, steps, board=None, cleanup=()):
+        self.name = name
+        self.steps = steps
+        self.board = board
+        self.cleanup = list(cleanup)
+
+
+def powered_timeline(name, relay_id, commands, after=(), settle=None):
+    """Power on a relay, wait, send `commands`, wait, power off, then send `after`."""
+    settle = SETTLE_TIME if settle is None else settle
+    steps = [("send", {"type": "relay", "id": relay_id, "state": 0}), ("wait", settle)]
+    steps += [("send", command) for command in commands]
+    steps.append(("wait", settle))
+    return Timeline(name, steps, board=board_of(relay_id), cleanup=[{"type": "relay", "id": relay_id, "state": 1}] + list(after))
+
+
+class Sequencer:
+    """
+    Runs independent actuator timelines concurrently. `publish` is awaited
+    for each command, so a timeline's waits start once the command before
+    them is acknowledged. Timelines start in the order given, so unpowered
+    actuators listed first are queued first. `budgets` maps board indexes
+    to their power budgets; other boards get POWER_BUDGET.
+    """
+
+    def __init__(self, publish, budgets=None):
+        self.publish = publish
+        self.budgets = budgets or {}
+
+    async def send(self, command):
+        await self.publish(command)
+
+    async def _run_steps(self, timeline):
+        try:
+            for kind, value in timeline.steps:
+                if kind == "wait":
+                    await asyncio.sleep(value)
+                else:
+                    await self.send(value)
+        finally:
+            for command in timeline.cleanup:
+                try:
+                    await self.send(command)
+                except Exception as e:
+                    print(f"Error sending cleanup for {timeline.name}: {e}")
+
+    async def _run(self, timeline, budgets):
+        if timeline.board is None:
+            return await self._run_steps(timeline)
+        async with budgets[timeline.board]:
+            return await self._run_steps(timeline)
+
+    async def run(self, timelines):
+        """
+        Run all timelines, each board's powered ones limited to its power
+        budget. Every timeline runs even if another fails; failures are
+        raised together afterwards. Returns the elapsed time in seconds.
+        """
+        start = time.monotonic()
+        budgets = {}
+        for timeline in timelines:
+            if timeline.board is not None and timeline.board not in budgets:
+                budgets[timeline.board] = asyncio.Semaphore(self.budgets.get(timeline.board, POWER_BUDGET))
+        results = await asyncio.gather(*(self._run(timeline, budgets) for timeline in timelines), return_exceptions=True)
+        errors = [f"{timeline.name}: {result}" for timeline, result in zip(timelines, results) if isinstance(result, BaseException)]
+        if errors:
+            raise RuntimeError(f"Failed to set {len(errors)} actuator(s): {'; '.join(errors)}")
+        return time.monotonic() - start
@@ -0,0 +1,77 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+# Distinguishes ETags across restarts, when sequence numbers start over
+BOOT_ID = os.urandom(4).hex()
+
+
+def encode_json(data):
+    """Encode data as JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, separators=(",", ":")).encode('utf-8')
+
+
+class Snapshot:
+    """
+    One published version of a telemetry frame.
+
+    The data must not be mutated after publishing. The encoded body is
+    produced on first use and cached, so frames nobody reads are never encoded.
+    """
+
+    __slots__ = ("seq", "data", "_body", "_text")
+
+    def __init__(self, seq, data):
+        self.seq = seq
+        self.data = data
+        self._body = None
+        self._text = None
+
+    @property
+    def etag(self):
+        return f'"{BOOT_ID}-{self.seq}"'
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = encode_json(self.data)
+        return self._body
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.body.decode('utf-8')
+        return self._text
+
+
+class SnapshotChannel:
+    """
+    Holds the latest Snapshot of a frame. publish() swaps in a new snapshot
+    with a single reference assignment, so readers always see a complete frame.
+    """
+
+    def __init__(self, initial):
+        self._seq = 0
+        self.current = Snapshot(0, initial)
+
+    def publish(self, data):
+        self._seq += 1
+        snapshot = Snapshot(self._seq, data)
+        self.current = snapshot
+        return snapshot
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header value against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in tags)
@@ -1,4 +1,6 @@
-const wsUrl = "ws://192.168.0.1:8000/ws_basic";
+// Binary protocol: JSON schema once, then packed float32 frames (see binary_stream.py)
+const useBinaryProtocol = false;
+const wsUrl = useBinaryProtocol ? "ws://192.168.0.1:8000/ws_binary" : "ws://192.168.0.1:8000/ws_basic";
 let socket;
 let reconnectAttempts = 0;
 const maxReconnectAttempts = 10;
@@ -10,10 +12,51 @@ const reconnectStatusElem = document.getElementById("reconnect-status");
 const sensorTableBody = document.getElementById("sensor-table-body");
 const gpioTableBody = document.getElementById("gpio-table-body");
 
+// Schema message of the binary protocol, needed to decode its frames
+let binarySchema = null;
+
+function decodeBinaryFrame(buffer) {
+  const view = new DataView(buffer);
+  const fieldCount = view.getUint8(1);
+  const schemaId = view.getUint16(2, true);
+  if (!binarySchema || binarySchema.schema_id !== schemaId) return null;
+  const timestamp = view.getFloat64(8, true);
+  const values = new Float32Array(buffer, binarySchema.header_bytes);
+  const sensors = binarySchema.sensors.map((sensor, i) => {
+    const row = { name: sensor.name, unit: sensor.unit, timestamp: timestamp };
+    binarySchema.fields.forEach((field, j) => {
+      const value = values[i * fieldCount + j];
+      row[field] = Number.isNaN(value) ? "N/A" : value.toFixed(2);
+    });
+    return row;
+  });
+  return { timestamp: timestamp, sensors: sensors };
+}
+
+function showDelay(timestamp) {
+  let receivedTime = Date.now() * 0.001//performance.timeOrigin + performance.now();
+  let sampleTime = timestamp * 0.001
+  let delay = receivedTime - sampleTime
+  delayElem.textContent = `${delay.toFixed(2)} s`;
+}
+
+// Latest row per sensor, so delta frames (/ws_basic?mode=delta) can be merged
+let sensorState = new Map();
+
+function mergeSensorFrame(frame) {
+  if (frame.type === "delta") {
+    frame.sensors.forEach(sensor => sensorState.set(sensor.name, sensor));
+  } else {
+    // full frames and keyframes replace the whole state
+    sensorState = new Map(frame.sensors.map(sensor => [sensor.name, sensor]));
+  }
+  return Array.from(sensorState.values());
+}
+
 function updateSensorTable(sensors) {
   sensorTableBody.innerHTML = "";
   if (!Array.isArray(sensors) || sensors.length === 0) {
-    sensorTableBody.innerHTML = "<tr><td colspan='4'>No sensor data available.</td></tr>";
+    sensorTableBody.innerHTML = "<tr><td colspan='7'>No sensor data available.</td></tr>";
     return;
   }
   sensors.forEach(sensor => {
@@ -21,6 +64,9 @@ function updateSensorTable(sensors) {
     const nameCell = document.createElement("td");
     const valueCell = document.createElement("td");
     const avgCell = document.createElement("td");
+    const stddevCell = document.createElement("td");
+    const minCell = document.createElement("td");
+    const maxCell = document.createElement("td");
     const rateCell = document.createElement("td");
 
     nameCell.textContent = sensor.name || "Unnamed";
@@ -30,11 +76,17 @@ function updateSensorTable(sensors) {
     valueCell.style.width = '100px';
     valueCell.title = sensor.value;
     avgCell.textContent = sensor.avg || "N/A";
+    stddevCell.textContent = sensor.stddev || "N/A";
+    minCell.textContent = sensor.min || "N/A";
+    maxCell.textContent = sensor.max || "N/A";
     rateCell.textContent = sensor.rate || "N/A";
  
     row.appendChild(nameCell);
     row.appendChild(valueCell);
     row.appendChild(avgCell);
+    row.appendChild(stddevCell);
+    row.appendChild(minCell);
+    row.appendChild(maxCell);
     row.appendChild(rateCell);
     sensorTableBody.appendChild(row);
   });
@@ -63,6 +115,7 @@ function updateGpioTable(gpios) {
 }
 function connectWebSocket() {
   socket = new WebSocket(wsUrl);
+  socket.binaryType = "arraybuffer";
 
   socket.onopen = () => {
     statusElem.textContent = "Connected";
@@ -72,16 +125,25 @@ function connectWebSocket() {
   };
 
   socket.onmessage = event => {
+    if (event.data instanceof ArrayBuffer) {
+      const frame = decodeBinaryFrame(event.data);
+      if (frame) {
+        showDelay(frame.timestamp);
+        updateSensorTable(frame.sensors);
+      }
+      return;
+    }
     try {
       const jsonData = JSON.parse(event.data);
+      if (jsonData && jsonData.type === "schema") {
+        binarySchema = jsonData;
+        return;
+      }
       if (jsonData && jsonData.sensors) {
-        let receivedTime = Date.now() * 0.001//performance.timeOrigin + performance.now();
-        let sampleTime = jsonData.sensors[0].timestamp * 0.001
-        let delay = receivedTime - sampleTime
-        delayElem.textContent = `${delay.toFixed(2)} s`;//`${receivedTime}-${jsonData.sensors[0].timestamp}`// `${delay.toFixed(2)} ms`;
-        updateSensorTable(jsonData.sensors);
+        if (jsonData.sensors.length) showDelay(jsonData.sensors[0].timestamp);
+        updateSensorTable(mergeSensorFrame(jsonData));
       }
-      else sensorTableBody.innerHTML = "<tr><td colspan='4'>Invalid data format.</td></tr>";
+      else sensorTableBody.innerHTML = "<tr><td colspan='7'>Invalid data format.</td></tr>";
       if (jsonData && jsonData.gpios) updateGpioTable(jsonData.gpios);
       else gpioTableBody.innerHTML = "<tr><td colspan='2'>Invalid GPIO data format.</td></tr>";
     } catch (err) {
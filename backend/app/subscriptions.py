@@ -0,0 +1,151 @@
+import asyncio
+import json
+import math
+import numpy as np
+import config_parser
+import data_interface
+from broadcast import BroadcastHub
+from snapshot import encode_json
+
+MAX_RATE = 10.0  # Hz, the fastest the processed stream is sent
+MIN_RATE = 0.1  # Hz
+
+groups = {}  # (sensor names, rate) -> DecimatedHub shared by every client with that subscription
+
+
+def _round(value):
+    return None if value is None else round(float(value), 2)
+
+
+class DecimatedHub(BroadcastHub):
+    """
+    Stream of per-bucket min/max/mean for a set of sensors at a fixed rate.
+
+    Samples are accumulated into per-sensor count/min/max/sum as they are
+    processed, and each tick summarises and resets them, so every sample is
+    counted exactly once however long the tick and however many clients
+    share the subscription.
+    """
+
+    def __init__(self, sensors, rate):
+        super().__init__(f"decimated {rate} Hz", lambda: True, interval=1.0 / rate)
+        self.sensors = sensors
+        self.rate = rate
+        self._buckets = {name: [0, math.inf, -math.inf, 0.0] for name in sensors}  # count, min, max, sum
+
+    def add(self, readings):
+        """Fold one message's calibrated readings into the current buckets."""
+        for name, bucket in self._buckets.items():
+            value = readings.get(name)
+            if value is None or not math.isfinite(value):
+                continue
+            bucket[0] += 1
+            if value < bucket[1]:
+                bucket[1] = value
+            if value > bucket[2]:
+                bucket[2] = value
+            bucket[3] += value
+
+    def _bucket(self, name):
+        count, low, high, total = self._buckets[name]
+        self._buckets[name] = [0, math.inf, -math.inf, 0.0]
+        bucket = {"name": name, "count": count, "min": None, "max": None, "mean": None, "last": None, "timestamp": None}
+        if count:
+            bucket.update(min=_round(low), max=_round(high), mean=_round(total / count))
+        hist = data_interface.data_store.get(name)
+        latest = hist.latest() if hist is not None else None
+        if latest is not None:
+            last_time, last_value = latest
+            bucket["last"] = _round(last_value) if np.isfinite(last_value) else None
+            bucket["timestamp"] = float(last_time) if np.isfinite(last_time) else None
+        return bucket
+
+    def encode(self, _):
+        frame = {"type": "decimated", "rate": self.rate, "sensors": [self._bucket(name) for name in self.sensors]}
+        return encode_json(frame).decode('utf-8')
+
+
+def parse_subscription(message):
+    """Validate a subscription message: {"sensors": [names], "rate": Hz}."""
+    request = json.loads(message)
+    if not isinstance(request, dict):
+        raise ValueError("Subscription must be a JSON object")
+    known = [sensor["name"] for sensor in config_parser.get_config()["sensors"].values()]
+    names = request.get("sensors") or known
+    if not isinstance(names, list):
+        raise ValueError("'sensors' must be a list of sensor names")
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown sensors: {unknown}")
+    try:
+        rate = float(request.get("rate", MAX_RATE))
+    except (TypeError, ValueError):
+        raise ValueError("'rate' must be a number")
+    if not math.isfinite(rate):
+        raise ValueError("'rate' must be a finite number")  # NaN would pass the clamp and make the sender spin
+    rate = round(min(max(rate, MIN_RATE), MAX_RATE), 2)
+    return tuple(sorted(set(names))), rate
+
+
+def join_group(sensors, rate):
+    key = (sensors, rate)
+    hub = groups.get(key)
+    if hub is None:
+        hub = groups[key] = DecimatedHub(sensors, rate)
+    return hub, hub.subscribe()
+
+
+def leave_group(hub, queue):
+    hub.unsubscribe(queue)
+    if hub.clients == 0:
+        groups.pop((hub.sensors, hub.rate), None)
+
+
+def _on_samples(readings):
+    for hub in list(groups.values()):
+        hub.add(readings)
+
+
+data_interface.sample_listeners.append(_on_samples)
+
+
+async def _stop_sender(sender):
+    """Cancel a client's sender task and wait for it, so only one task ever writes to the socket."""
+    sender.cancel()
+    try:
+        await sender
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        print(f"Subscription sender failed: {e!r}")
+
+
+async def serve(websocket):
+    """
+    Serve an accepted WebSocket whose client sends subscription messages.
+    A new message replaces the client's current subscription.
+    """
+    hub = queue = sender = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is None:
+                continue
+            try:
+                sensors, rate = parse_subscription(message["text"])
+            except ValueError as e:  # includes JSONDecodeError
+                await websocket.send_text(json.dumps({"type": "error", "detail": str(e)}))
+                continue
+            if sender is not None:
+                await _stop_sender(sender)
+                leave_group(hub, queue)
+                sender = None
+            await websocket.send_text(json.dumps({"type": "subscribed", "sensors": list(sensors), "rate": rate}))
+            hub, queue = join_group(sensors, rate)
+            sender = asyncio.create_task(hub.send_frames(websocket, queue))
+    finally:
+        if sender is not None:
+            await _stop_sender(sender)
+            leave_group(hub, queue)
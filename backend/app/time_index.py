@@ -0,0 +1,44 @@
+import os
+import struct
+import numpy as np
+
+INDEX_SUFFIX = ".idx"
+ENTRY = struct.Struct('<dQ')  # elapsed seconds, byte offset of the row
+ENTRY_DTYPE = np.dtype([('time', '<f8'), ('offset', '<u8')])
+
+# A sidecar index is a flat array of (elapsed time, byte offset) entries, one
+# for every Nth row of a data file, written in time order alongside it.
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def encode_entry(elapsed, offset):
+    return ENTRY.pack(elapsed, offset)
+
+
+def load_index(path):
+    """Entries of a data file's sidecar index, or None if it has none."""
+    sidecar = index_path(path)
+    if not os.path.isfile(sidecar):
+        return None
+    with open(sidecar, 'rb') as file:
+        data = file.read()
+    # ignore a partially written final entry
+    usable = len(data) - len(data) % ENTRY.size
+    return np.frombuffer(data[:usable], dtype=ENTRY_DTYPE)
+
+
+def seek_offset(path, start):
+    """
+    Byte offset of the last indexed row at or before `start` seconds, or None
+    if the file has no index or no indexed row that early.
+    """
+    entries = load_index(path)
+    if entries is None or len(entries) == 0:
+        return None
+    position = int(np.searchsorted(entries['time'], start, side='right')) - 1
+    if position < 0:
+        return None
+    return int(entries['offset'][position])
@@ -0,0 +1,249 @@
+from abc import ABC, abstractmethod
+import itertools
+import queue
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+MAX_QUEUED_MESSAGES = 64  # outgoing messages paho may hold; more fail with MQTT_ERR_QUEUE_SIZE
+
+
+class PublishInfo:
+    """Result of a publish: paho's return code and the message id on_publish reports."""
+
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+
+class Transport(ABC):
+    """
+    What the backend needs from an MQTT connection. Callbacks keep paho's
+    (VERSION1) signatures and receive the transport as `client`:
+
+        on_connect(client, userdata, flags, rc)
+        on_message(client, userdata, message)  # message.topic, message.payload (bytes)
+        on_publish(client, userdata, mid)      # sent (QoS 0) or acknowledged (QoS 1/2)
+
+    They run on the transport's network thread, never on the event loop.
+    """
+
+    on_connect = None
+    on_message = None
+    on_publish = None
+
+    @abstractmethod
+    def connect(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def disconnect(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def subscribe(self, topic, qos=0):
+        raise NotImplementedError
+
+    @abstractmethod
+    def publish(self, topic, payload, qos=0):
+        """Queue a message for the network thread. Returns a PublishInfo."""
+        raise NotImplementedError
+
+    def discard(self, mid):
+        """Drop a message that is still queued or unacknowledged, so it is never (re)sent."""
+
+    @property
+    def network_thread(self):
+        """The thread callbacks run on, or None before connect()."""
+        return None
+
+
+class PahoTransport(Transport):
+    """
+    A paho-mqtt client connected to a broker, with its network loop on
+    paho's own thread. Messages published while disconnected are dropped
+    rather than left in paho's queue to be sent on reconnect.
+    """
+
+    def __init__(self, host, port, client=None):
+        self.host = host
+        self.port = port
+        self.client = client or mqtt.Client()
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.on_publish = self._on_publish
+        self.client.max_queued_messages_set(MAX_QUEUED_MESSAGES)
+
+    def _on_connect(self, client, userdata, flags, rc, *args):
+        if self.on_connect is not None:
+            self.on_connect(self, userdata, flags, rc)
+
+    def _on_message(self, client, userdata, message):
+        if self.on_message is not None:
+            self.on_message(self, userdata, message)
+
+    def _on_publish(self, client, userdata, mid, *args):
+        if self.on_publish is not None:
+            self.on_publish(self, userdata, mid)
+
+    def connect(self):
+        self.client.connect(self.host, self.port)
+        self.client.loop_start()
+
+    def disconnect(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def subscribe(self, topic, qos=0):
+        return self.client.subscribe(topic, qos)
+
+    def publish(self, topic, payload, qos=0):
+        info = self.client.publish(topic, payload, qos=qos)
+        if info.rc == mqtt.MQTT_ERR_NO_CONN:
+            self.discard(info.mid)
+        return PublishInfo(info.rc, info.mid)
+
+    def discard(self, mid):
+        # paho has no public way to withdraw a message, so this mirrors what it does on PUBACK
+        client = self.client
+        with client._out_message_mutex:
+            message = client._out_messages.pop(mid, None)
+            if message is not None and message.qos > 0 and message.state != mqtt.mqtt_ms_publish:
+                client._inflight_messages -= 1
+
+    @property
+    def network_thread(self):
+        return getattr(self.client, "_thread", None)  # started by loop_start()
+
+
+class LoopbackMessage:
+    """Stand-in for paho's MQTTMessage."""
+
+    __slots__ = ("topic", "payload", "qos", "retain", "mid", "timestamp")
+
+    def __init__(self, topic, payload, qos, mid):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = False
+        self.mid = mid
+        self.timestamp = time.monotonic()
+
+
+class LoopbackBroker:
+    """
+    In-process stand-in for the MQTT broker. Messages from every connected
+    LoopbackTransport are routed, in publish order, by one delivery thread
+    to each client with a matching subscription (MQTT wildcards included),
+    the publisher too. The publisher's on_publish fires once a message has
+    been delivered, like a broker's acknowledgement.
+    """
+
+    def __init__(self):
+        self._clients = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self.delivered = 0
+
+    def attach(self, client):
+        with self._lock:
+            if client not in self._clients:
+                self._clients.append(client)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._deliver, name="loopback-mqtt", daemon=True)
+                self._thread.start()
+        return self._thread
+
+    def detach(self, client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def route(self, sender, message):
+        self._queue.put((self._route, sender, message))
+
+    def call(self, callback, *args):
+        """Run a callback on the delivery thread, after the messages already queued."""
+        self._queue.put((callback, *args))
+
+    def _route(self, sender, message):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            if client.subscribed(message.topic):
+                client._dispatch(message)
+                self.delivered += 1
+        sender._acknowledge(message.mid)
+
+    def _deliver(self):
+        while True:
+            callback, *args = self._queue.get()
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in loopback delivery: {e}")
+
+
+class LoopbackTransport(Transport):
+    """
+    Transport to a LoopbackBroker in this process, so the backend runs
+    without a network. Callbacks run on the broker's delivery thread, as
+    paho's run on its network thread. A simulated Pi is another
+    LoopbackTransport on the same broker, subscribed to the command topic.
+    """
+
+    def __init__(self, broker=None):
+        self.broker = broker or LoopbackBroker()
+        self._subscriptions = {}  # topic filter -> qos
+        self._mids = itertools.count(1)
+        self._thread = None
+        self.connected = False
+
+    def connect(self):
+        self._thread = self.broker.attach(self)
+        self.connected = True
+        # like paho, on_connect runs on the network thread, then queued messages go out
+        self.broker.call(self._connected)
+
+    def disconnect(self):
+        self.connected = False
+        self.broker.detach(self)
+
+    def subscribe(self, topic, qos=0):
+        self._subscriptions[topic] = qos
+        return mqtt.MQTT_ERR_SUCCESS, next(self._mids)
+
+    def subscribed(self, topic):
+        return any(mqtt.topic_matches_sub(pattern, topic) for pattern in list(self._subscriptions))
+
+    def publish(self, topic, payload, qos=0):
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        message = LoopbackMessage(topic, bytes(payload), qos, next(self._mids))
+        if not self.connected:
+            return PublishInfo(mqtt.MQTT_ERR_NO_CONN, message.mid)
+        self.broker.route(self, message)
+        return PublishInfo(mqtt.MQTT_ERR_SUCCESS, message.mid)
+
+    def _connected(self):
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0)
+
+    def _dispatch(self, message):
+        if self.on_message is not None:
+            try:
+                self.on_message(self, None, message)
+            except Exception as e:
+                print(f"Error in loopback on_message: {e}")
+
+    def _acknowledge(self, mid):
+        if self.on_publish is not None:
+            self.on_publish(self, None, mid)
+
+    @property
+    def network_thread(self):
+        return self._thread